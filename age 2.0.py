@@ -0,0 +1,103 @@
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.utils import to_categorical
+from tensorflow.keras import mixed_precision
+from sklearn.model_selection import train_test_split
+from dataset_cache import load_cache, make_dataset
+from inference import age_categories, img_dims
+from model import build
+import tensorflow as tf
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import argparse
+import utkface
+
+# initial parameters
+epochs = 100
+lr = 1e-3
+batch_size = 64
+
+
+# Function to pick the compute precision: float16 on a GPU, float32 on CPU
+# (--precision mixed_bfloat16 pays off on CPUs with AVX512-BF16 or AMX)
+def choose_precision(precision):
+    if precision != 'auto':
+        return precision
+    if tf.config.list_physical_devices('GPU'):
+        return 'mixed_float16'
+    return 'float32'
+
+
+# Function to let TensorFlow use every core for training, or a given number of threads
+def configure_threads(threads):
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+
+
+# Function to print the number of images in every age category
+def print_distribution(labels):
+    counts = np.bincount(labels, minlength=len(age_categories))
+    for category, count in zip(age_categories, counts):
+        print("{:>6}: {:>6} ({:.1%})".format(category, count, count / float(len(labels))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the age detection model on UTKFace')
+    parser.add_argument('--dataset', default='UTKFace')
+    parser.add_argument('--cache', default='UTKFace_cache', help='where the decoded 96x96 images are cached')
+    parser.add_argument('--output', default='age_detection.h5')
+    parser.add_argument('--epochs', type=int, default=epochs)
+    parser.add_argument('--batch-size', type=int, default=batch_size)
+    parser.add_argument('--precision', default='auto', choices=['auto', 'float32', 'mixed_float16', 'mixed_bfloat16'])
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads for training, all cores by default')
+    parser.add_argument('--workers', type=int, default=None, help='processes decoding images when building the cache')
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+
+    # age, gender and race come from the filenames, ages are bucketed like age_categories
+    samples = utkface.list_images(args.dataset)
+    data, labels = load_cache(samples, args.cache, args.workers)
+    ages = labels[:, 0]
+    print_distribution(ages)
+    ages = to_categorical(ages, num_classes=len(age_categories)).astype("float32")
+
+    # split dataset for training and validation
+    (trainIdx, testIdx) = train_test_split(np.arange(len(data)), test_size=0.2, random_state=42)
+    train_ds = make_dataset(data, ages, trainIdx, args.batch_size, augment=True, shuffle=True)
+    test_ds = make_dataset(data, ages, testIdx, args.batch_size)
+
+    precision = choose_precision(args.precision)
+    mixed_precision.set_global_policy(precision)
+    print("Training in {} on {}".format(precision, "GPU" if tf.config.list_physical_devices('GPU') else "CPU"))
+
+    # same backbone and head as the gender model, with an 8-way softmax
+    model = build(width=img_dims[0], height=img_dims[1], depth=img_dims[2],
+                  classes=len(age_categories), activation="softmax")
+    model.compile(loss="categorical_crossentropy", optimizer=Adam(learning_rate=lr), metrics=["accuracy"])
+
+    H = model.fit(train_ds, validation_data=test_ds, epochs=args.epochs, verbose=1)
+
+    # save a float32 copy, so inference doesn't depend on the training precision
+    if precision != 'float32':
+        mixed_precision.set_global_policy('float32')
+        weights = model.get_weights()
+        model = build(width=img_dims[0], height=img_dims[1], depth=img_dims[2],
+                      classes=len(age_categories), activation="softmax")
+        model.set_weights(weights)
+    model.save(args.output)
+
+    # plot the training loss and accuracy
+    plt.style.use("ggplot")
+    plt.figure()
+    plt.plot(np.arange(0, args.epochs), H.history["loss"], label="train_loss")
+    plt.plot(np.arange(0, args.epochs), H.history["val_loss"], label="val_loss")
+    plt.plot(np.arange(0, args.epochs), H.history["accuracy"], label="train_acc")
+    plt.plot(np.arange(0, args.epochs), H.history["val_accuracy"], label="val_acc")
+    plt.title("Training Loss and Accuracy on Age Classification")
+    plt.xlabel("Epoch #")
+    plt.ylabel("Loss/Accuracy")
+    plt.legend(loc="upper right")
+    plt.savefig("age_plot.png")
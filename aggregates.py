@@ -0,0 +1,151 @@
+import collections
+import csv
+import io
+import os
+import threading
+
+from inference import age_categories, gender_classes
+
+# Number of first/most recent rows kept for the dashboard tables
+table_rows = 10
+
+
+# Running counters over a predictions CSV file
+# refresh() only reads the bytes appended since the previous call, so its cost depends on the
+# number of new rows, not on the size of the file. A file that shrinks (rotated or truncated)
+# is counted again from the start
+class PredictionAggregator:
+    def __init__(self, filename='predictions.csv', time_bucket_length=13):
+        self.filename = filename
+        # Timestamps are written as '%Y-%m-%d %H:%M:%S', the first 13 characters give hourly buckets
+        self.time_bucket_length = time_bucket_length
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.columns = []
+        self.total = 0
+        self.gender_counts = collections.Counter()
+        self.age_counts = collections.Counter()
+        self.age_gender_counts = collections.Counter()
+        self.time_counts = collections.Counter()
+        self.first = []
+        self.recent = collections.deque(maxlen=table_rows)
+
+    # Function to count the rows appended since the last refresh, returns the number of new rows
+    def refresh(self):
+        with self.lock:
+            try:
+                size = os.path.getsize(self.filename)
+            except OSError:
+                return 0
+
+            if size < self.offset:
+                self.reset()
+            if size == self.offset:
+                return 0
+
+            with open(self.filename, 'rb') as file:
+                file.seek(self.offset)
+                data = file.read(size - self.offset)
+
+            # Leave a partially written last line for the next refresh
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                return 0
+            self.offset += end
+
+            rows = csv.reader(io.StringIO(data[:end].decode('utf-8')))
+            if not self.columns:
+                self.columns = next(rows, [])
+
+            return self.count(rows)
+
+    def count(self, rows):
+        age_col = self.columns.index('Predicted_Age')
+        gender_col = self.columns.index('Predicted_Gender')
+        time_col = self.columns.index('Timestamp') if 'Timestamp' in self.columns else None
+
+        new_rows = 0
+        for row in rows:
+            if len(row) < len(self.columns):
+                continue
+            age = row[age_col]
+            gender = row[gender_col]
+            self.total += 1
+            self.gender_counts[gender] += 1
+            self.age_counts[age] += 1
+            self.age_gender_counts[(age, gender)] += 1
+            if time_col is not None:
+                self.time_counts[row[time_col][:self.time_bucket_length]] += 1
+            if len(self.first) < table_rows:
+                self.first.append(row)
+            self.recent.append(row)
+            new_rows += 1
+        return new_rows
+
+    # Function to get a consistent copy of all counters
+    def snapshot(self):
+        with self.lock:
+            return {
+                'columns': list(self.columns),
+                'total': self.total,
+                'gender': dict(self.gender_counts),
+                'age': dict(self.age_counts),
+                'age_gender': dict(self.age_gender_counts),
+                'time': dict(sorted(self.time_counts.items())),
+                'first': list(self.first),
+                'recent': list(self.recent),
+            }
+
+
+# One aggregator per file, shared by every dashboard running in the process
+aggregators = {}
+aggregators_lock = threading.Lock()
+
+
+# Function to get the shared aggregator for a predictions file
+def get_aggregator(filename='predictions.csv'):
+    with aggregators_lock:
+        if filename not in aggregators:
+            aggregators[filename] = PredictionAggregator(filename)
+        return aggregators[filename]
+
+
+# Function to get the counters of the shared aggregator for a predictions file, after a refresh
+def get_aggregates(filename='predictions.csv'):
+    aggregator = get_aggregator(filename)
+    aggregator.refresh()
+    return aggregator.snapshot()
+
+
+# Function to order the age buckets of a snapshot like age_categories, unknown labels last
+def ordered_ages(snapshot):
+    known = [age for age in age_categories if age in snapshot['age']]
+    return known + sorted(age for age in snapshot['age'] if age not in age_categories)
+
+
+# Function to order the genders of a snapshot like gender_classes, unknown labels last
+def ordered_genders(snapshot):
+    known = [gender for gender in gender_classes if gender in snapshot['gender']]
+    return known + sorted(gender for gender in snapshot['gender'] if gender not in gender_classes)
+
+
+# Function to get the quartiles of the age bucket index from counts, for precomputed box plots
+# Returns (min, q1, median, q3, max) as indexes into ages
+def age_quartiles(counts, ages):
+    total = sum(counts.get(age, 0) for age in ages)
+    if total == 0:
+        return None
+
+    def quantile(q):
+        position = q * (total - 1)
+        seen = 0
+        for idx, age in enumerate(ages):
+            seen += counts.get(age, 0)
+            if seen > position:
+                return idx
+        return len(ages) - 1
+
+    return quantile(0.0), quantile(0.25), quantile(0.5), quantile(0.75), quantile(1.0)
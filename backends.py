@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+
+# Inference backends for the age and gender models
+# Every backend is called like a Keras model, backend(batch, training=False), with the same
+# preprocessing (96x96 BGR, float32 / 255) and returns one array, or [gender, age] for the fused model
+
+# Backend names and the suffix their model files get next to the .h5 file
+backend_suffixes = {
+    'keras': '.h5',
+    'tflite': '.tflite',
+    'tflite-fp16': '_fp16.tflite',
+    'tflite-int8': '_int8.tflite',
+    'onnx': '.onnx',
+}
+
+
+# Function to get the model file of a backend from the .h5 path, e.g. age_detection.h5 -> age_detection_int8.tflite
+def backend_path(h5_path, backend):
+    if backend not in backend_suffixes:
+        raise ValueError("Unknown backend: {}".format(backend))
+    return h5_path[:-len('.h5')] + backend_suffixes[backend] if h5_path.endswith('.h5') else h5_path
+
+
+# Function to put the outputs of a converted model back in [gender, age] order
+# Converters don't keep the Keras output order, the 2-way gender head is told apart by its width
+def order_outputs(outputs):
+    if len(outputs) == 1:
+        return outputs[0]
+    return sorted(outputs, key=lambda output: output.shape[-1])
+
+
+# Keras model with its forward pass traced once into a graph for any batch size, the first
+# call (or the warm-up) pays for the tracing instead of every call running eagerly
+class KerasBackend:
+    def __init__(self, path):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+        self.model = load_model(path)
+        spec = tf.TensorSpec((None,) + tuple(self.model.input_shape[1:]), tf.float32)
+        self.forward = tf.function(lambda batch: self.model(batch, training=False), input_signature=[spec])
+
+    def __call__(self, batch, training=False):
+        outputs = self.forward(batch.astype(np.float32, copy=False))
+        if isinstance(outputs, (list, tuple)):
+            return [np.asarray(output) for output in outputs]
+        return np.asarray(outputs)
+
+
+# Function to get the TFLite interpreter class
+# Prefers the standalone runtimes, TensorFlow itself is only needed as a fallback
+def tflite_interpreter():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    def __init__(self, path, threads=None):
+        self.interpreter = tflite_interpreter()(model_path=path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.batch_size = int(self.input['shape'][0])
+        # The interpreter holds its tensors, so one batch at a time
+        self.lock = threading.Lock()
+
+    # Function to convert a float batch to the input type, for fully integer quantized models
+    def quantize(self, batch):
+        dtype = self.input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self.input['quantization']
+        return np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    @staticmethod
+    def dequantize(detail, output):
+        if detail['dtype'] == np.float32:
+            return output
+        scale, zero_point = detail['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def __call__(self, batch, training=False):
+        with self.lock:
+            if len(batch) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input['index'], [len(batch)] + list(self.input['shape'][1:]))
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(batch)
+            self.interpreter.set_tensor(self.input['index'], self.quantize(batch))
+            self.interpreter.invoke()
+            outputs = [self.dequantize(detail, self.interpreter.get_tensor(detail['index']))
+                       for detail in self.interpreter.get_output_details()]
+        return order_outputs(outputs)
+
+
+class OnnxBackend:
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch, training=False):
+        outputs = self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})
+        return order_outputs(outputs)
+
+
+backends = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'tflite-fp16': TFLiteBackend,
+    'tflite-int8': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+
+# Function to import the runtime library of a backend, so the import can be timed apart from loading
+def import_runtime(backend):
+    if backend not in backends:
+        raise ValueError("Unknown backend: {}".format(backend))
+    if backend == 'keras':
+        import tensorflow
+    elif backend == 'onnx':
+        import onnxruntime
+    else:
+        tflite_interpreter()
+
+
+# Function to load the model exported from h5_path for a backend
+def load_backend(h5_path, backend='keras'):
+    if backend not in backends:
+        raise ValueError("Unknown backend: {}".format(backend))
+    return backends[backend](backend_path(h5_path, backend))
@@ -0,0 +1,184 @@
+from inference import predict_frames
+from model_registry import get_models
+from prediction_sink import PredictionWriter
+from detectors import load_detector, detectors
+import cv2
+import argparse
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# Video file extensions picked up when a directory is given
+video_extensions = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.mpg', '.mpeg', '.wmv')
+
+# Header of the per-video prediction files
+header = ['Video', 'Frame', 'Video_Time', 'Predicted_Age', 'Predicted_Gender', 'Age_Confidence', 'Gender_Confidence']
+
+# Models and face detector of the current worker process, loaded once by init_worker
+gender_model = None
+age_model = None
+face_detector = None
+
+# Marker for the end of a video in the decode queue
+END = None
+
+
+# Function to expand the command line inputs into a sorted list of (video file, name) pairs
+# The name is the path relative to the directory given (the file name for files given directly), so
+# videos with the same file name in different folders get their own output; names that still clash
+# get a hash of the full path appended
+def find_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for folder, dirs, files in os.walk(path):
+                videos.extend((os.path.join(folder, name), os.path.relpath(os.path.join(folder, name), path))
+                              for name in files if name.lower().endswith(video_extensions))
+        else:
+            videos.append((path, os.path.basename(path)))
+
+    counts = {}
+    for path, name in videos:
+        counts[name] = counts.get(name, 0) + 1
+    named = []
+    for path, name in videos:
+        if counts[name] > 1:
+            root, extension = os.path.splitext(name)
+            name = '{}_{}{}'.format(root, hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8], extension)
+        named.append((path, name))
+    return sorted(named)
+
+
+# Function to format a video offset in seconds as HH:MM:SS.mmm
+def format_video_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return "{:02d}:{:02d}:{:06.3f}".format(hours, minutes, seconds)
+
+
+# Decode thread: grab every frame but only decode every stride-th one
+def decode(path, stride, frames):
+    capture = cv2.VideoCapture(path)
+    frame_idx = 0
+    while capture.isOpened():
+        if not capture.grab():
+            break
+        if frame_idx % stride == 0:
+            status, frame = capture.retrieve()
+            if not status:
+                break
+            frames.put((frame_idx, frame))
+        frame_idx += 1
+    capture.release()
+    frames.put(END)
+
+
+# Function to initialise a worker process: share the CPU cores between processes, load and warm up the models
+# Recorded footage is usually larger than 640x480, detect_width detects on a downscaled copy while the
+# faces are still cropped from the full resolution frame
+def init_worker(threads, detector=None, detect_width=None):
+    global gender_model, age_model, face_detector
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    cv2.setNumThreads(1)
+    gender_model, age_model = get_models()
+    face_detector = load_detector(detector, detect_width)
+
+
+# Function to process one video, writing its predictions next to the other outputs
+# name is the video's name from find_videos; an output left by an earlier run is replaced
+# Returns (path, frames sampled, faces classified, video seconds, processing seconds)
+def process_video(path, name, stride, batch, output_dir):
+    start = time.perf_counter()
+
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+    capture.release()
+
+    output = os.path.join(output_dir, os.path.splitext(name)[0].replace(os.sep, '__') + '.predictions.csv')
+    if os.path.exists(output):
+        os.remove(output)
+    writer = PredictionWriter(output, header=header)
+
+    frames = queue.Queue(maxsize=2 * batch)
+    decoder = threading.Thread(target=decode, args=(path, stride, frames), daemon=True)
+    decoder.start()
+
+    sampled = 0
+    faces = 0
+    pending = []
+    while True:
+        item = frames.get()
+        if item is not END:
+            frame_idx, frame = item
+            face, confidence = face_detector(frame)
+            pending.append((frame_idx, frame, face))
+            sampled += 1
+
+        # Classify the faces of a whole batch of frames at once
+        if pending and (len(pending) >= batch or item is END):
+            predictions = predict_frames([(frame, face) for frame_idx, frame, face in pending], gender_model, age_model)
+            for (frame_idx, frame, face), frame_predictions in zip(pending, predictions):
+                video_time = format_video_time(frame_idx / fps)
+                for prediction in frame_predictions:
+                    if prediction is None:
+                        continue
+                    age_label, age_conf, gender_label, gender_conf = prediction
+                    writer.write([name, frame_idx, video_time, age_label, gender_label,
+                                  round(age_conf, 4), round(gender_conf, 4)])
+                    faces += 1
+            pending = []
+
+        if item is END:
+            break
+
+    decoder.join()
+    writer.close()
+    return path, sampled, faces, total_frames / fps, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless age and gender detection on recorded footage')
+    parser.add_argument('inputs', nargs='+', help='video files or directories')
+    parser.add_argument('--stride', type=int, default=5, help='classify every n-th frame')
+    parser.add_argument('--batch', type=int, default=16, help='frames per inference batch')
+    parser.add_argument('--processes', type=int, default=max(1, os.cpu_count() // 2))
+    parser.add_argument('--output', default='batch_predictions')
+    parser.add_argument('--detector', default=None, choices=sorted(detectors), help='face detector backend')
+    parser.add_argument('--detect-width', type=int, default=None, help='detect faces on frames downscaled to this width')
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error("--stride must be at least 1")
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+
+    videos = find_videos(args.inputs)
+    os.makedirs(args.output, exist_ok=True)
+    processes = max(1, min(args.processes, len(videos)))
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    print("Processing {} videos on {} processes ({} threads each)".format(len(videos), processes, threads))
+
+    start = time.perf_counter()
+    total_sampled = 0
+    total_video = 0.0
+    # spawn rather than fork, TensorFlow does not survive being forked
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=init_worker,
+                      initargs=(threads, args.detector, args.detect_width)) as pool:
+        jobs = [pool.apply_async(process_video, (path, name, args.stride, args.batch, args.output))
+                for path, name in videos]
+        for job in jobs:
+            path, sampled, faces, video_seconds, seconds = job.get()
+            total_sampled += sampled
+            total_video += video_seconds
+            print("{}: {} frames sampled, {} faces, {:.1f}s of video in {:.1f}s ({:.1f} fps)".format(
+                path, sampled, faces, video_seconds, seconds, sampled / seconds if seconds else 0.0))
+
+    elapsed = time.perf_counter() - start
+    print("Total: {} frames in {:.1f}s ({:.1f} sampled frames/s, {:.1f}x real time)".format(
+        total_sampled, elapsed, total_sampled / elapsed, total_video / elapsed))
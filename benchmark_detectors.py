@@ -0,0 +1,97 @@
+from detectors import load_detector, detectors
+from tracker import iou
+import cv2
+import argparse
+import json
+import time
+
+
+# Function to read every stride-th frame of the clips, up to max_frames per clip, so every detector sees the same frames
+def read_frames(clips, stride, max_frames):
+    frames = []
+    for clip in clips:
+        capture = cv2.VideoCapture(clip)
+        frame_idx = 0
+        taken = 0
+        while taken < max_frames and capture.grab():
+            if frame_idx % stride == 0:
+                status, frame = capture.retrieve()
+                if not status:
+                    break
+                frames.append(frame)
+                taken += 1
+            frame_idx += 1
+        capture.release()
+    return frames
+
+
+# Function to count the reference faces a detection matches, each reference face matching at most once
+def count_matches(reference, faces, threshold):
+    matched = set()
+    for f in faces:
+        best, best_iou = None, threshold
+        for idx, r in enumerate(reference):
+            overlap = iou(f, r)
+            if idx not in matched and overlap >= best_iou:
+                best, best_iou = idx, overlap
+        if best is not None:
+            matched.add(best)
+    return len(matched)
+
+
+# Function to run a detector over the frames, returns (ms per frame, recall, extra faces per frame)
+# against the reference detections; recall is None when the reference found no faces
+def evaluate(detector, frames, reference, threshold):
+    detector(frames[0])
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        detections.append(detector(frame)[0])
+    ms = (time.perf_counter() - start) / len(frames) * 1e3
+
+    total = sum(len(r) for r in reference)
+    matches = sum(count_matches(r, faces, threshold) for r, faces in zip(reference, detections))
+    found = sum(len(faces) for faces in detections)
+    return ms, matches / float(total) if total else None, (found - matches) / float(len(frames))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Speed vs recall of the face detector backends on local test clips')
+    parser.add_argument('clips', nargs='+', help='video files, ideally recorded by the cameras the detector is for')
+    parser.add_argument('--detectors', default='cvlib,ssd,haar,yunet', help='comma separated backends')
+    parser.add_argument('--widths', default='0,480,320,240', help='detection widths to try, 0 for the native size')
+    parser.add_argument('--reference', default='ssd', help='backend whose full resolution detections count as ground truth')
+    parser.add_argument('--stride', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=100, help='frames per clip')
+    parser.add_argument('--iou', type=float, default=0.4, help='overlap needed to match a reference face')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args()
+
+    frames = read_frames(args.clips, args.stride, args.frames)
+    if not frames:
+        parser.error("no frames could be read from the clips")
+    print("{} frames of {}x{} from {} clips".format(len(frames), frames[0].shape[1], frames[0].shape[0], len(args.clips)))
+
+    reference_detector = load_detector(args.reference, width=0)
+    reference = [reference_detector(frame)[0] for frame in frames]
+    print("reference: {} faces by {}".format(sum(len(r) for r in reference), args.reference))
+
+    results = []
+    print("{:>8} {:>6} {:>10} {:>8} {:>8} {:>12}".format("detector", "width", "ms/frame", "fps", "recall", "extra/frame"))
+    for name in args.detectors.split(','):
+        if name not in detectors:
+            parser.error("unknown detector {}, choose from {}".format(name, ', '.join(sorted(detectors))))
+        for width in [int(width) for width in args.widths.split(',')]:
+            try:
+                detector = load_detector(name, width=width)
+            except (IOError, ImportError) as error:
+                print("{:>8} skipped: {}".format(name, error))
+                break
+            ms, recall, extra = evaluate(detector, frames, reference, args.iou)
+            results.append({'detector': name, 'width': width, 'ms_per_frame': ms, 'recall': recall, 'extra_per_frame': extra})
+            print("{:>8} {:>6} {:>10.2f} {:>8.1f} {:>8} {:>12.2f}".format(
+                name, width or 'native', ms, 1e3 / ms, '-' if recall is None else '{:.1%}'.format(recall), extra))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'clips': args.clips, 'frames': len(frames), 'reference': args.reference, 'results': results}, file, indent=2)
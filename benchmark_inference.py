@@ -0,0 +1,65 @@
+from tensorflow.keras.preprocessing.image import img_to_array
+from tensorflow.keras.models import load_model
+from inference import predict_faces
+import numpy as np
+import cv2
+import argparse
+import time
+
+# Face counts to measure per-frame latency for
+face_counts = [0, 1, 2, 5, 10, 20]
+
+
+# Function to lay out n non-overlapping 80x80 face boxes over a 640x480 frame
+def make_faces(n, width=640, height=480, size=80):
+    faces = []
+    cols = width // size
+    for i in range(n):
+        x = (i % cols) * size
+        y = (i // cols) * size % height
+        faces.append([x, y, x + size, y + size])
+    return faces
+
+
+# Per-face path used by the capture scripts before batching
+def predict_faces_one_by_one(frame, face, gender_model, age_model):
+    for f in face:
+        face_crop = np.copy(frame[f[1]:f[3], f[0]:f[2]])
+        if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
+            continue
+        face_crop = cv2.resize(face_crop, (96, 96))
+        face_crop = face_crop.astype("float") / 255.0
+        face_crop = img_to_array(face_crop)
+        face_crop = np.expand_dims(face_crop, axis=0)
+        gender_model.predict(face_crop, verbose=0)
+        age_model.predict(face_crop, verbose=0)
+
+
+# Function to time a prediction function over a number of frames, returning ms per frame
+def time_per_frame(fn, frame, face, gender_model, age_model, repeats):
+    fn(frame, face, gender_model, age_model)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(frame, face, gender_model, age_model)
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-frame age and gender inference latency against face count')
+    parser.add_argument('--gender-model', default='gender_detection.h5')
+    parser.add_argument('--age-model', default='age_detection.h5')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    gender_model = load_model(args.gender_model)
+    age_model = load_model(args.age_model)
+
+    frame = np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    print("{:>6} {:>14} {:>14} {:>8}".format("faces", "per-face ms", "batched ms", "speedup"))
+    for n in face_counts:
+        face = make_faces(n)
+        old_ms = time_per_frame(predict_faces_one_by_one, frame, face, gender_model, age_model, args.repeats)
+        new_ms = time_per_frame(predict_faces, frame, face, gender_model, age_model, args.repeats)
+        speedup = old_ms / new_ms if new_ms > 0 else float('nan')
+        print("{:>6} {:>14.2f} {:>14.2f} {:>7.1f}x".format(n, old_ms, new_ms, speedup))
@@ -0,0 +1,38 @@
+from metrics import Metrics
+import argparse
+import time
+
+# Timed steps per frame in statistical_implementation.py: read, resize, detect_face, preprocess,
+# gender_predict, age_predict, csv_write, video_write, imshow and the three stages
+steps_per_frame = 12
+
+
+# Function to measure the cost of one timed step in microseconds
+def span_cost(metrics, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        with metrics.timed('step'):
+            pass
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost of the capture loop instrumentation')
+    parser.add_argument('--repeats', type=int, default=200000)
+    parser.add_argument('--frame-ms', type=float, default=50.0, help='time one frame takes without instrumentation')
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    cost = span_cost(metrics, args.repeats)
+    start = time.perf_counter()
+    metrics.render()
+    render_ms = (time.perf_counter() - start) * 1e3
+
+    traced = Metrics()
+    traced.trace_to(None)
+    traced_cost = span_cost(traced, args.repeats)
+
+    frame_us = args.frame_ms * 1e3
+    print("timed step: {:.2f} us, {:.2f} us with tracing; render: {:.2f} ms".format(cost, traced_cost, render_ms))
+    print("{} steps per {:.0f} ms frame: {:.3%} of the loop, {:.3%} with tracing".format(
+        steps_per_frame, args.frame_ms, steps_per_frame * cost / frame_us, steps_per_frame * traced_cost / frame_us))
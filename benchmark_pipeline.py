@@ -0,0 +1,234 @@
+from benchmark_inference import make_faces
+from inference import predict_faces, img_dims, age_categories, gender_classes
+from metrics import metrics
+from pipeline import Pipeline, BLOCK, END
+from prediction_sink import PredictionWriter
+import numpy as np
+import cv2
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Face counts every run is measured at
+face_counts = [0, 1, 5, 20]
+
+
+# cv2.VideoCapture stand-in returning frames with n faces, a recorded video looped or synthetic frames
+# Synthetic frames are noise with a blurred patch in every face box, drifting a few pixels per frame
+class SyntheticSource:
+    def __init__(self, faces, frames, video=None, size=(640, 480)):
+        self.faces = faces
+        self.frames = frames
+        self.size = size
+        self.read_count = 0
+        self.video = cv2.VideoCapture(video) if video else None
+        rng = np.random.default_rng(0)
+        self.background = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        self.patch = cv2.resize(rng.integers(0, 256, (12, 12, 3), dtype=np.uint8), (80, 80))
+        self.boxes = make_faces(faces, size[0], size[1])
+
+    def isOpened(self):
+        return self.read_count < self.frames
+
+    def read(self):
+        if self.read_count >= self.frames:
+            return False, None
+        self.read_count += 1
+        if self.video is not None:
+            status, frame = self.video.read()
+            if not status:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                status, frame = self.video.read()
+            return status, cv2.resize(frame, self.size)
+
+        frame = self.background.copy()
+        for x1, y1, x2, y2 in self.current_boxes():
+            frame[y1:y2, x1:x2] = self.patch[:y2 - y1, :x2 - x1]
+        return True, frame
+
+    # Function to get where the faces of the current frame are, the stub detector's answer
+    def current_boxes(self):
+        shift = self.read_count % 8
+        return [[x1 + shift, y1, min(x2 + shift, self.size[0]), y2] for x1, y1, x2, y2 in self.boxes]
+
+    def release(self):
+        if self.video is not None:
+            self.video.release()
+
+
+# Headless cv2.imshow stand-in, counts the frames that would have been shown
+class HeadlessDisplay:
+    def __init__(self):
+        self.frames = 0
+
+    def imshow(self, name, frame):
+        self.frames += 1
+
+
+# Function to save randomly initialised models with the shapes of the real ones (96x96x3 input,
+# 2-way gender sigmoid, 8-way age softmax) and load them like the real ones
+def stub_models(folder, backend='keras'):
+    from model import build
+    from inference import load_models
+
+    gender_path = os.path.join(folder, 'gender_stub.h5')
+    age_path = os.path.join(folder, 'age_stub.h5')
+    build(img_dims[0], img_dims[1], img_dims[2], classes=len(gender_classes), activation="sigmoid").save(gender_path)
+    build(img_dims[0], img_dims[1], img_dims[2], classes=len(age_categories), activation="softmax").save(age_path)
+    return load_models(None, gender_path, age_path, backend=backend)
+
+
+# Function to measure how many rows per second the CSV sink takes
+def sink_throughput(folder, rows=100000):
+    writer = PredictionWriter(os.path.join(folder, 'throughput.csv'))
+    start = time.perf_counter()
+    for _ in range(rows):
+        writer.write(['26-35', 'man'])
+    writer.close()
+    return rows / (time.perf_counter() - start)
+
+
+# Function to run the capture -> detect -> classify -> sink pipeline over a source with n faces
+# and return its measurements; runs in its own process, so the peak RSS is that of one face count
+def run(faces, args):
+    folder = tempfile.mkdtemp(prefix='benchmark_pipeline_')
+    if args.stub_models:
+        gender_model, age_model = stub_models(folder, args.backend)
+    else:
+        from model_registry import get_models
+        gender_model, age_model = get_models()
+
+    source = SyntheticSource(faces, args.frames + args.warmup, args.video)
+    if args.detector == 'stub':
+        detect_faces = lambda frame: source.current_boxes()
+    else:
+        from detectors import load_detector
+        detector = load_detector(args.detector)
+        detect_faces = lambda frame: detector(frame)[0]
+
+    writer = PredictionWriter(os.path.join(folder, 'predictions.csv'))
+    display = HeadlessDisplay()
+    counts = {'rows': 0, 'sink_time': 0.0}
+
+    def detect(frame):
+        return frame, detect_faces(frame)
+
+    def classify(item):
+        frame, face = item
+        with metrics.timed('classify_frame'):
+            predictions = predict_faces(frame, face, gender_model, age_model)
+        return frame, face, predictions
+
+    def sink(item):
+        frame, face, predictions = item
+        start = time.perf_counter()
+        for f, prediction in zip(face, predictions):
+            if prediction is None:
+                continue
+            age_label, age_conf, gender_label, gender_conf = prediction
+            writer.write([age_label, gender_label])
+            cv2.rectangle(frame, (f[0], f[1]), (f[2], f[3]), (0, 255, 0), 2)
+            counts['rows'] += 1
+        counts['sink_time'] += time.perf_counter() - start
+        return frame
+
+    pipeline = Pipeline(source, [('detect', detect), ('classify', classify), ('sink', sink)],
+                        queue_size=4, drop_policy=BLOCK)
+    pipeline.start()
+
+    shown = 0
+    start = None
+    while True:
+        frame = pipeline.get()
+        if frame is END:
+            break
+        display.imshow("Gender and Age Detection", frame)
+        shown += 1
+        # Measure from the end of the warm-up frames, the first calls trace the models
+        if shown == args.warmup:
+            start = time.perf_counter()
+            metrics.get_timer('classify_frame').samples.clear()
+            counts.update(rows=0, sink_time=0.0)
+    elapsed = time.perf_counter() - start if start else 0.0
+    pipeline.join()
+    writer.close()
+
+    frames = shown - args.warmup
+    classify = metrics.get_timer('classify_frame').stats()
+
+    def per_face(seconds):
+        return seconds / faces * 1e3 if faces else None
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / 1024.0 ** 2 if sys.platform == 'darwin' else peak_rss / 1024.0
+    result = {
+        'faces': faces,
+        'frames': frames,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'classify_ms': {'p50': classify['p50'] * 1e3, 'p95': classify['p95'] * 1e3, 'p99': classify['p99'] * 1e3},
+        'per_face_ms': {'p50': per_face(classify['p50']), 'p95': per_face(classify['p95'])},
+        'sink_rows': counts['rows'],
+        'sink_rows_per_s': counts['rows'] / counts['sink_time'] if counts['sink_time'] > 0 else None,
+        'csv_rows_per_s': sink_throughput(folder),
+        'peak_rss_mb': peak_rss_mb,
+    }
+    shutil.rmtree(folder, ignore_errors=True)
+    return result
+
+
+# Function to describe the machine and libraries a result was measured with
+def environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'opencv': cv2.__version__}
+    try:
+        import tensorflow as tf
+        info['tensorflow'] = tf.__version__
+    except ImportError:
+        pass
+    return info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the capture pipeline without a webcam or display')
+    parser.add_argument('--faces', default=','.join(str(n) for n in face_counts), help='comma separated face counts')
+    parser.add_argument('--frames', type=int, default=200, help='frames measured per face count')
+    parser.add_argument('--warmup', type=int, default=10, help='frames run before measuring')
+    parser.add_argument('--video', default=None, help='recorded video to loop instead of synthetic frames')
+    parser.add_argument('--detector', default='stub', help='stub (the synthetic boxes) or a detectors.py backend')
+    parser.add_argument('--stub-models', action='store_true', help='randomly initialised models instead of the .h5 files')
+    parser.add_argument('--backend', default='keras', help='model backend, see backends.py')
+    parser.add_argument('--output', default='benchmark_pipeline.json')
+    parser.add_argument('--run', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: measure one face count and print the result
+    if args.run is not None:
+        print(json.dumps(run(args.run, args)))
+        raise SystemExit
+
+    results = []
+    print("{:>6} {:>8} {:>14} {:>14} {:>12} {:>12} {:>10}".format(
+        "faces", "fps", "classify p95", "per face p50", "sink rows/s", "csv rows/s", "peak MB"))
+    for faces in [int(n) for n in args.faces.split(',')]:
+        command = [sys.executable, __file__, '--run', str(faces)] + [arg for arg in sys.argv[1:]]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print("{:>6} {:>8.1f} {:>11.2f} ms {:>14} {:>12} {:>12.0f} {:>10.0f}".format(
+            faces, result['fps'], result['classify_ms']['p95'],
+            '-' if result['per_face_ms']['p50'] is None else '{:.2f} ms'.format(result['per_face_ms']['p50']),
+            '-' if result['sink_rows_per_s'] is None else '{:.0f}'.format(result['sink_rows_per_s']),
+            result['csv_rows_per_s'], result['peak_rss_mb']))
+
+    with open(args.output, 'w') as file:
+        json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'args': vars(args), 'environment': environment(),
+                   'results': results}, file, indent=2)
+    print("Results saved to {}".format(args.output))
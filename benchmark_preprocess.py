@@ -0,0 +1,79 @@
+from inference import preprocess_faces, classify_batch, img_dims, age_categories, gender_classes
+from benchmark_inference import make_faces
+import numpy as np
+import cv2
+import argparse
+import time
+
+# Face counts to measure preprocessing time for
+face_counts = [1, 2, 5, 10, 20]
+
+
+# Per-face path used by the capture scripts before batching: float64 temporaries for every face
+def preprocess_one_by_one(frame, face):
+    crops = []
+    for f in face:
+        face_crop = np.copy(frame[f[1]:f[3], f[0]:f[2]])
+        if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
+            continue
+        face_crop = cv2.resize(face_crop, (img_dims[0], img_dims[1]))
+        face_crop = face_crop.astype("float") / 255.0
+        face_crop = np.asarray(face_crop, dtype="float32")  # img_to_array
+        crops.append(np.expand_dims(face_crop, axis=0))
+    return crops
+
+
+# Batched path that stacked freshly allocated crops before the preallocated buffer
+def preprocess_stacked(frame, face):
+    crops = []
+    for f in face:
+        face_crop = frame[f[1]:f[3], f[0]:f[2]]
+        if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
+            continue
+        crops.append(cv2.resize(face_crop, (img_dims[0], img_dims[1])))
+    return np.stack(crops).astype("float32") / 255.0
+
+
+# Function to time a preprocessing function, returning microseconds per face
+def time_per_face(fn, frame, face, repeats):
+    fn(frame, face)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(frame, face)
+    return (time.perf_counter() - start) / repeats / len(face) * 1e6
+
+
+# Function to get the (age, gender) labels a model pair gives to a batch
+def labels(batch, gender_model, age_model):
+    gender_conf, age_conf = classify_batch(batch, gender_model, age_model)
+    return [(age_categories[a], gender_classes[g])
+            for a, g in zip(np.argmax(age_conf, axis=1), np.argmax(gender_conf, axis=1))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Face preprocessing time per face: per-face, stacked and preallocated')
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--check-labels', action='store_true', help='also compare model labels (loads the models)')
+    args = parser.parse_args()
+
+    frame = np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    print("{:>6} {:>14} {:>14} {:>16} {:>8}".format("faces", "per-face us", "stacked us", "preallocated us", "saving"))
+    for n in face_counts:
+        face = make_faces(n)
+        old_us = time_per_face(preprocess_one_by_one, frame, face, args.repeats)
+        stacked_us = time_per_face(preprocess_stacked, frame, face, args.repeats)
+        new_us = time_per_face(preprocess_faces, frame, face, args.repeats)
+        print("{:>6} {:>14.1f} {:>14.1f} {:>16.1f} {:>7.0%}".format(n, old_us, stacked_us, new_us, 1 - new_us / old_us))
+
+    # The new batch must be exactly what the model used to get
+    face = make_faces(20)
+    batch, kept = preprocess_faces(frame, face)
+    old = np.concatenate(preprocess_one_by_one(frame, face))
+    print("identical to stacked path: {}, max difference to per-face path: {:.2e}".format(
+        np.array_equal(batch, preprocess_stacked(frame, face)), np.abs(batch - old).max()))
+
+    if args.check_labels:
+        from model_registry import get_models
+        gender_model, age_model = get_models()
+        print("identical labels: {}".format(labels(batch, gender_model, age_model) == labels(old, gender_model, age_model)))
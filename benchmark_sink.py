@@ -0,0 +1,48 @@
+from prediction_sink import PredictionWriter
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+
+# Per-row open/append/close path used by the capture scripts before the buffered writer
+def append_prediction_to_csv(age, gender, filename='predictions.csv'):
+    if not os.path.isfile(filename):
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Predicted_Age', 'Predicted_Gender'])
+
+    with open(filename, 'a', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([age, gender])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-row cost of the CSV prediction sinks')
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        old_path = os.path.join(folder, 'old.csv')
+        start = time.perf_counter()
+        for i in range(args.rows):
+            append_prediction_to_csv('26-35', 'man', old_path)
+        old_us = (time.perf_counter() - start) / args.rows * 1e6
+
+        new_path = os.path.join(folder, 'new.csv')
+        writer = PredictionWriter(new_path)
+        start = time.perf_counter()
+        for i in range(args.rows):
+            writer.write(['26-35', 'man'])
+        hot_us = (time.perf_counter() - start) / args.rows * 1e6
+        writer.close()
+        total_us = (time.perf_counter() - start) / args.rows * 1e6
+
+        with open(new_path) as file:
+            assert sum(1 for _ in file) == args.rows + 1
+
+    print("open/append/close per row:       {:8.2f} us".format(old_us))
+    print("buffered writer, capture thread: {:8.2f} us".format(hot_us))
+    print("buffered writer, incl. close:    {:8.2f} us".format(total_us))
+    print("speedup on the capture thread:   {:8.1f}x".format(old_us / hot_us))
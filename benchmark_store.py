@@ -0,0 +1,84 @@
+from prediction_store import PredictionStore
+from inference import age_categories, gender_classes
+import pandas as pd
+import numpy as np
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+
+# Function to generate one day of synthetic predictions in the daily CSV format
+def make_day(date, rows, rng):
+    seconds = np.sort(rng.integers(0, 24 * 3600, rows))
+    return pd.DataFrame({
+        'Timestamp': (pd.Timestamp(date) + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'Predicted_Age': rng.choice(age_categories, rows),
+        'Predicted_Gender': rng.choice(gender_classes, rows),
+    })
+
+
+# Function to load a time range the way the dashboards do today: read every daily CSV and filter
+def load_csvs(folder, start, end):
+    frame = pd.concat([pd.read_csv(path) for path in sorted(glob.glob(os.path.join(folder, 'predictions_*.csv')))])
+    timestamps = pd.to_datetime(frame['Timestamp'])
+    return frame[(timestamps >= start) & (timestamps <= end)]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load a month of predictions from daily CSVs vs. the parquet store')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--rows-per-day', type=int, default=50000)
+    args = parser.parse_args()
+    if args.days < 1:
+        parser.error("--days must be at least 1")
+
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2024-06-01', periods=args.days, freq='D')
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = PredictionStore(os.path.join(folder, 'store'))
+        for date in dates:
+            day = make_day(date, args.rows_per_day, rng)
+            day.to_csv(os.path.join(folder, 'predictions_{}.csv'.format(date.strftime('%Y%m%d'))), index=False)
+            store.append(day.rename(columns={'Timestamp': 'timestamp', 'Predicted_Age': 'age',
+                                             'Predicted_Gender': 'gender'}))
+
+        # A week (or all the days, if fewer) and a single day from the middle of the range
+        end_of_day = pd.Timedelta(hours=23, minutes=59, seconds=59)
+        middle = len(dates) // 2
+        week = dates[max(0, middle - 3):max(0, middle - 3) + 7]
+        ranges = [
+            ('all {} days'.format(len(dates)), dates[0], dates[-1] + end_of_day),
+            ('{} days'.format(len(week)), week[0], week[-1] + end_of_day),
+            ('one day', dates[middle], dates[middle] + end_of_day),
+        ]
+
+        print("{} days x {} rows".format(args.days, args.rows_per_day))
+        print("{:>12} {:>10} {:>10} {:>8}".format("range", "csv s", "store s", "speedup"))
+        for name, start, end in ranges:
+            csv_time, csv_rows = timed(load_csvs, folder, start, end)
+            store_time, store_rows = timed(store.query, start, end, columns=['timestamp', 'age', 'gender'])
+            assert len(csv_rows) == len(store_rows)
+            print("{:>12} {:>10.3f} {:>10.3f} {:>7.1f}x".format(name, csv_time, store_time, csv_time / store_time))
+
+        # Gender split per hour over the whole range: raw rows grouped on every query vs. the hourly rollup
+        rollup_time, _ = timed(store.rollup)
+        start, end = ranges[0][1], ranges[0][2]
+
+        def split_from_rows():
+            rows = store.query(start, end, columns=['timestamp', 'gender'])
+            return rows.groupby([rows['timestamp'].dt.floor('h'), rows['gender'].astype(str)]).size()
+
+        raw_time, raw_split = timed(split_from_rows)
+        hourly_time, hourly_split = timed(store.query_rollup, 'hour', start, end, by=['bucket', 'gender'])
+        assert raw_split.sum() == hourly_split['count'].sum()
+        print("gender split per hour: rows {:.3f} s, hourly rollup {:.4f} s ({:.0f}x), building the rollups took {:.2f} s".format(
+            raw_time, hourly_time, raw_time / hourly_time, rollup_time))
@@ -0,0 +1,163 @@
+import time
+
+import numpy as np
+import cv2
+
+# Size frames are downscaled to for the motion check
+motion_size = (80, 60)
+
+
+# Function to shift boxes from one frame to the next with sparse optical flow
+# Each box moves by the median displacement of the corners tracked inside it; boxes with too
+# few tracked points stay where they were
+def carry_boxes(prev_gray, gray, boxes, min_points=4):
+    carried = []
+    for box in boxes:
+        x1, y1, x2, y2 = [int(v) for v in box]
+        mask = np.zeros_like(prev_gray)
+        mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 255
+        points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=20, qualityLevel=0.01, minDistance=3, mask=mask)
+        if points is None or len(points) < min_points:
+            carried.append([x1, y1, x2, y2])
+            continue
+
+        moved, status, error = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None)
+        good = status.reshape(-1) == 1
+        if good.sum() < min_points:
+            carried.append([x1, y1, x2, y2])
+            continue
+
+        dx, dy = np.median((moved - points).reshape(-1, 2)[good], axis=0)
+        carried.append([int(round(x1 + dx)), int(round(y1 + dy)), int(round(x2 + dx)), int(round(y2 + dy))])
+    return carried
+
+
+# Face detection that only runs the full detector every `interval` frames, or when something moves
+# outside the known faces, and carries the boxes forward with optical flow in between
+# The interval adapts between 1 and max_interval so detection and carrying together take at most
+# 1/target_fps seconds per frame on average, measured on their own so a slow camera or display
+# doesn't push the interval up
+class AdaptiveDetector:
+    def __init__(self, detect, target_fps=20.0, max_interval=15, motion_threshold=8.0, smoothing=0.1):
+        self.detect = detect
+        self.target_fps = target_fps
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold
+        self.smoothing = smoothing
+
+        self.interval = 1
+        self.since_detection = 0
+        self.boxes = []
+        self.prev_gray = None
+        self.prev_small = None
+        self.last_call = None
+
+        self.frames = 0
+        self.detections = 0
+        self.motion_detections = 0
+        self.period = None
+        self.detect_time = None
+        self.carry_time = None
+
+    # Function to forget the carried boxes, so the next frame runs the full detector
+    # (e.g. after frames were skipped)
+    def reset(self):
+        self.boxes = []
+        self.prev_gray = None
+        self.prev_small = None
+        self.last_call = None
+
+    def average(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    # Function to check for motion outside the boxes being carried forward
+    def motion_outside_boxes(self, small, frame_shape):
+        if self.prev_small is None:
+            return True
+        diff = cv2.absdiff(small, self.prev_small)
+        scale_x = motion_size[0] / float(frame_shape[1])
+        scale_y = motion_size[1] / float(frame_shape[0])
+        for x1, y1, x2, y2 in self.boxes:
+            diff[max(int(y1 * scale_y), 0):max(int(y2 * scale_y) + 1, 0),
+                 max(int(x1 * scale_x), 0):max(int(x2 * scale_x) + 1, 0)] = 0
+        return float(diff.mean()) > self.motion_threshold
+
+    # Function to get the average seconds per frame of detecting every interval-th frame
+    def frame_cost(self, duty_cycle):
+        return duty_cycle * self.detect_time + (1.0 - duty_cycle) * (self.carry_time or 0.0)
+
+    # Function to adapt the detection interval to the measured detection and carrying times
+    # Picks the smallest interval whose average cost per frame fits in the 1/target_fps budget
+    def adapt(self):
+        budget = 1.0 / self.target_fps
+        detect_time = self.detect_time
+        carry_time = self.carry_time or 0.0
+        if detect_time <= budget:
+            interval = 1
+        elif carry_time >= budget:
+            interval = self.max_interval
+        else:
+            # (detect_time + (n - 1) * carry_time) / n <= budget
+            interval = int(np.ceil((detect_time - carry_time) / (budget - carry_time)))
+        self.interval = min(max(interval, 1), self.max_interval)
+
+    # Function to get the face boxes of a frame, returns (face, detected)
+    def __call__(self, frame):
+        now = time.perf_counter()
+        if self.last_call is not None:
+            self.period = self.average(self.period, now - self.last_call)
+        self.last_call = now
+        self.frames += 1
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, motion_size, interpolation=cv2.INTER_AREA)
+
+        detected = False
+        if self.prev_gray is None or self.since_detection + 1 >= self.interval:
+            detected = True
+        elif self.motion_outside_boxes(small, frame.shape):
+            detected = True
+            self.motion_detections += 1
+
+        start = time.perf_counter()
+        if detected:
+            self.boxes = [list(box) for box in self.detect(frame)]
+            self.detect_time = self.average(self.detect_time, time.perf_counter() - start)
+            self.detections += 1
+            self.since_detection = 0
+            self.adapt()
+        else:
+            if self.boxes:
+                self.boxes = carry_boxes(self.prev_gray, gray, self.boxes)
+            self.carry_time = self.average(self.carry_time, time.perf_counter() - start)
+            self.since_detection += 1
+
+        self.prev_gray = gray
+        self.prev_small = small
+        return self.boxes, detected
+
+    def stats(self):
+        duty_cycle = self.detections / float(self.frames) if self.frames else 0.0
+        fps = 1.0 / self.period if self.period else 0.0
+        stats = {
+            'interval': self.interval,
+            'duty_cycle': duty_cycle,
+            'motion_detections': self.motion_detections,
+            'fps': fps,
+        }
+        # Frame rate of face detection alone, as run and when running the detector on every frame
+        if self.detect_time:
+            stats['detect_fps'] = 1.0 / self.frame_cost(duty_cycle)
+            stats['fps_always_detecting'] = 1.0 / self.detect_time
+            stats['fps_gained'] = stats['detect_fps'] - stats['fps_always_detecting']
+        return stats
+
+
+# Function to format detector stats as one line for the console
+def format_stats(stats):
+    line = "detector every {} frames, duty cycle {:.0%}, {:.1f} fps".format(
+        stats['interval'], stats['duty_cycle'], stats['fps'])
+    if 'fps_gained' in stats:
+        line += ", detection {:.1f} fps (+{:.1f} fps vs. detecting every frame)".format(
+            stats['detect_fps'], stats['fps_gained'])
+    return line
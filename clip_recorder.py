@@ -0,0 +1,188 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from pipeline import StageQueue, BLOCK, END
+
+# Name of the clip index in the clips folder: one JSON line per finished clip
+index_file = 'index.jsonl'
+
+
+# Recorder that only encodes video while faces are in view
+# The last pre_roll seconds of frames are kept in a fixed-size ring buffer; when faces appear a new
+# clip is started with those frames, and it ends once no face has been seen for idle seconds (or
+# after max_clip seconds, when a new clip follows straight away). Clips are encoded on a background
+# thread to timestamped files in folder, and only the max_clips newest are kept when it is set.
+# Prediction records logged while a clip is open (record) are listed with the clip in index.jsonl.
+class ClipRecorder:
+    def __init__(self, folder='clips', fps=20.0, pre_roll=3.0, idle=5.0, max_clip=300.0, max_clips=None,
+                 fourcc='mp4v', extension='.mp4'):
+        self.folder = folder
+        self.fps = fps
+        self.idle = idle
+        self.max_clip = max_clip
+        self.max_clips = max_clips
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.extension = extension
+        os.makedirs(folder, exist_ok=True)
+
+        # Allocated on the first frame, once the frame size is known
+        self.ring_size = max(1, int(round(pre_roll * fps)))
+        self.ring = None
+        self.ring_times = [0.0] * self.ring_size
+        self.ring_start = 0
+        self.ring_count = 0
+
+        # The encoder can fall behind by a second of video before write() waits for it
+        self.queue = StageQueue(maxsize=max(self.ring_size, int(fps)) + 2, drop_policy=BLOCK)
+        self.encoder = threading.Thread(target=self.encode, name='clip-encoder', daemon=True)
+        self.encoder.start()
+
+        self.clip = None
+        self.last_active = None
+        self.closed = False
+
+        self.clips = 0
+        self.frames_encoded = 0
+        self.frames_idle = 0
+        self.records_unindexed = 0
+
+    # Function to add one frame, active telling whether faces are in view; cheap while idle
+    def write(self, frame, active, timestamp=None):
+        now = time.time() if timestamp is None else timestamp
+
+        if self.clip is None:
+            if not active:
+                self.buffer(frame, now)
+                self.frames_idle += 1
+                return
+            self.open_clip(now, pre_roll=True)
+
+        self.add_frame(frame.copy(), now)
+        if active:
+            self.last_active = now
+        if now - self.last_active >= self.idle:
+            self.close_clip()
+        elif now - self.clip['start'] >= self.max_clip:
+            self.close_clip()
+            self.open_clip(now, pre_roll=False)
+
+    # Function to list a prediction record (e.g. a CSV row) with the clip being recorded
+    # Records logged between clips are only counted; with an idle time longer than the tracker takes
+    # to drop a person, every person seen in a clip is logged before it ends
+    def record(self, row):
+        if self.clip is None:
+            self.records_unindexed += 1
+            return
+        self.clip['records'].append(list(row))
+
+    def buffer(self, frame, now):
+        if self.ring is None or self.ring.shape[1:] != frame.shape:
+            self.ring = np.empty((self.ring_size,) + frame.shape, dtype=frame.dtype)
+            self.ring_start = 0
+            self.ring_count = 0
+        slot = (self.ring_start + self.ring_count) % self.ring_size
+        np.copyto(self.ring[slot], frame)
+        self.ring_times[slot] = now
+        if self.ring_count < self.ring_size:
+            self.ring_count += 1
+        else:
+            self.ring_start = (self.ring_start + 1) % self.ring_size
+
+    def open_clip(self, now, pre_roll):
+        slots = [(self.ring_start + i) % self.ring_size for i in range(self.ring_count)] if pre_roll else []
+        start = self.ring_times[slots[0]] if slots else now
+        name = 'clip_{}{}'.format(datetime.datetime.fromtimestamp(start).strftime('%Y%m%d_%H%M%S_%f'), self.extension)
+        self.clip = {'clip': name, 'start': start, 'frames': 0, 'pre_roll_frames': len(slots), 'records': []}
+        self.queue.put(('open', self.clip))
+        self.last_active = now
+
+        # The encoder gets copies, the ring is written again as soon as the clip ends
+        for slot in slots:
+            self.add_frame(self.ring[slot].copy(), self.ring_times[slot])
+        self.ring_count = 0
+
+    def add_frame(self, frame, now):
+        self.clip['frames'] += 1
+        self.clip['end'] = now
+        self.queue.put(('frame', frame))
+
+    def close_clip(self):
+        self.queue.put(('close', self.clip))
+        self.clip = None
+        self.clips += 1
+
+    # Encoder thread: writes the queued frames of every clip and indexes finished clips
+    def encode(self):
+        writer = None
+        while True:
+            item = self.queue.get()
+            if item is END:
+                return
+            kind, value = item
+            if kind == 'frame':
+                if writer is None:
+                    height, width = value.shape[:2]
+                    writer = cv2.VideoWriter(os.path.join(self.folder, clip['clip']), self.fourcc, self.fps, (width, height))
+                writer.write(value)
+                self.frames_encoded += 1
+            elif kind == 'open':
+                clip = value
+                writer = None
+            elif kind == 'close':
+                if writer is not None:
+                    writer.release()
+                    writer = None
+                self.index(value)
+                self.prune()
+
+    def index(self, clip):
+        entry = {
+            'clip': clip['clip'],
+            'start': datetime.datetime.fromtimestamp(clip['start']).strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'end': datetime.datetime.fromtimestamp(clip['end']).strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'frames': clip['frames'],
+            'pre_roll_frames': clip['pre_roll_frames'],
+            'records': clip['records'],
+        }
+        with open(os.path.join(self.folder, index_file), 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+
+    # Function to delete the oldest clips beyond max_clips, their index lines are kept
+    def prune(self):
+        if not self.max_clips:
+            return
+        clips = sorted(name for name in os.listdir(self.folder) if name.startswith('clip_') and name.endswith(self.extension))
+        for name in clips[:-self.max_clips]:
+            os.remove(os.path.join(self.folder, name))
+
+    # Function to end the current clip and wait for the encoder to finish writing it
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.clip is not None:
+            self.close_clip()
+        self.queue.put(END)
+        self.encoder.join()
+
+    def stats(self):
+        return {
+            'recording': self.clip is not None,
+            'clips': self.clips,
+            'frames_encoded': self.frames_encoded,
+            'frames_idle': self.frames_idle,
+            'queue_depth': self.queue.depth(),
+            'records_unindexed': self.records_unindexed,
+        }
+
+
+# Function to format recorder stats as one line for the console
+def format_stats(stats):
+    return "recorder {} clips, {} frames encoded, {} idle frames skipped{}".format(
+        stats['clips'], stats['frames_encoded'], stats['frames_idle'], ", recording" if stats['recording'] else "")
@@ -1,71 +1,92 @@
 import dash
 from dash import dcc, html
-import plotly.express as px
-import pandas as pd
+from live_updates import add_live_updates, script_url
+import figures
 
-# Load data
-data = pd.read_csv('predictions.csv')
+# Predictions file the dashboard follows
+filename = 'predictions.csv'
 
-# Calculate statistics
-total_count = len(data)
-male_count = (data['Predicted_Gender'] == 'man').sum()
-female_count = (data['Predicted_Gender'] == 'woman').sum()
-age_distribution = data['Predicted_Age'].value_counts()
+# Figures of the dashboard by graph id, rebuilt by the live publisher whenever new rows arrive
+graphs = {
+    'gender-pie-chart': lambda aggregates: figures.gender_pie(aggregates, title='Gender Distribution', names={'man': 'Male', 'woman': 'Female'}),
+    'age-bar-chart': lambda aggregates: figures.age_bar(aggregates, title='Age Distribution'),
+}
 
-# Define app
-app = dash.Dash(__name__)
-
-# Define layout
-app.layout = html.Div([
-    html.Link(
-        rel='stylesheet',
-        href='/assets/styles.css'  # Link to the CSS file in the assets folder
-    ),
-    html.Div([
-        html.H1("Age and Gender Prediction Dashboard", className="text-center mb-4"),
-        
+
+# Function to calculate statistics, by element id
+def statistics(aggregates):
+    return {
+        'total-count': f"{aggregates['total']}",
+        'male-count': f"{aggregates['gender'].get('man', 0)}",
+        'female-count': f"{aggregates['gender'].get('woman', 0)}",
+    }
+
+
+# Function to build the page with the current counts, later changes are pushed to the browser
+def layout():
+    aggregates = publisher.current()
+    stats = statistics(aggregates)
+
+    return html.Div(id='live-dashboard', children=[
+        html.Link(
+            rel='stylesheet',
+            href='/assets/styles.css'  # Link to the CSS file in the assets folder
+        ),
         html.Div([
+            html.H1("Age and Gender Prediction Dashboard", className="text-center mb-4"),
+
             html.Div([
                 html.Div([
-                    html.H4("Total Count", className="card-title"),
-                    html.P(f"{total_count}", className="card-text")
-                ], className="card-body"),
-            ], className="card col-md-4"),
-            
-            html.Div([
+                    html.Div([
+                        html.H4("Total Count", className="card-title"),
+                        html.P(stats['total-count'], id='total-count', className="card-text")
+                    ], className="card-body"),
+                ], className="card col-md-4"),
+
                 html.Div([
-                    html.H4("Male Count", className="card-title"),
-                    html.P(f"{male_count}", className="card-text")
-                ], className="card-body"),
-            ], className="card col-md-4"),
-            
-            html.Div([
+                    html.Div([
+                        html.H4("Male Count", className="card-title"),
+                        html.P(stats['male-count'], id='male-count', className="card-text")
+                    ], className="card-body"),
+                ], className="card col-md-4"),
+
                 html.Div([
-                    html.H4("Female Count", className="card-title"),
-                    html.P(f"{female_count}", className="card-text")
-                ], className="card-body"),
-            ], className="card col-md-4")
-        ], className="row mb-4"),
-        
-        html.Div([
-            html.Div([
-                html.H2("Gender Distribution", className="mb-3"),
-                dcc.Graph(
-                    id='gender-pie-chart',
-                    figure=px.pie(names=['Male', 'Female'], values=[male_count, female_count], title='Gender Distribution')
-                )
-            ], className="col-lg-6"),
-    
+                    html.Div([
+                        html.H4("Female Count", className="card-title"),
+                        html.P(stats['female-count'], id='female-count', className="card-text")
+                    ], className="card-body"),
+                ], className="card col-md-4")
+            ], className="row mb-4"),
+
             html.Div([
-                html.H2("Age Distribution", className="mb-3"),
-                dcc.Graph(
-                    id='age-bar-chart',
-                    figure=px.bar(x=age_distribution.index, y=age_distribution.values, title='Age Distribution')
-                )
-            ], className="col-lg-6")
-        ], className="row mb-4"),
-    ], className="container")
-])
+                html.Div([
+                    html.H2("Gender Distribution", className="mb-3"),
+                    dcc.Graph(
+                        id='gender-pie-chart',
+                        figure=graphs['gender-pie-chart'](aggregates)
+                    )
+                ], className="col-lg-6"),
+
+                html.Div([
+                    html.H2("Age Distribution", className="mb-3"),
+                    dcc.Graph(
+                        id='age-bar-chart',
+                        figure=graphs['age-bar-chart'](aggregates)
+                    )
+                ], className="col-lg-6")
+            ], className="row mb-4"),
+        ], className="container")
+    ])
+
+
+# Define app
+app = dash.Dash(__name__, external_scripts=[script_url])
+
+# Push new counts and patched figures to every open page as predictions are written
+publisher = add_live_updates(app, filename, graphs, stats=statistics)
+
+# Define layout, built again for every page load so it never shows the counts from startup
+app.layout = layout
 
 # Run app
 if __name__ == '__main__':
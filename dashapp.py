@@ -1,7 +1,7 @@
 import dash
 from dash import html, dcc, callback, Output, Input
-import pandas as pd
-import plotly.express as px
+from aggregates import get_aggregates
+import figures
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
@@ -35,28 +35,28 @@ app.layout = html.Div([
     [Input("update-button", "n_clicks")]
 )
 def update_data(n_clicks):
-    # Read updated data from CSV
-    updated_data = pd.read_csv('predictions.csv')
+    # Count only the rows appended to the CSV since the last update
+    aggregates = get_aggregates('predictions.csv')
+    columns = aggregates['columns']
 
     # Generate bar chart
-    bar_fig = px.bar(updated_data, x='Predicted_Age', color='Predicted_Gender', barmode='group',
-                     title='Age Group Distribution by Gender')
+    bar_fig = figures.age_gender_bar(aggregates, title='Age Group Distribution by Gender')
 
     # Generate pie chart
-    pie_fig = px.pie(updated_data, names='Predicted_Gender', title='Gender Distribution')
+    pie_fig = figures.gender_pie(aggregates, title='Gender Distribution')
 
     # Calculate statistics
-    total_count = len(updated_data)
-    male_count = len(updated_data[updated_data['Predicted_Gender'] == 'man'])
-    female_count = len(updated_data[updated_data['Predicted_Gender'] == 'woman'])
-    age_group_counts = updated_data['Predicted_Age'].value_counts().to_dict()
+    total_count = aggregates['total']
+    male_count = aggregates['gender'].get('man', 0)
+    female_count = aggregates['gender'].get('woman', 0)
+    age_group_counts = aggregates['age']
 
     # Display updated data and statistics
     data_table = html.Table([
-        html.Thead(html.Tr([html.Th(col) for col in updated_data.columns])),
+        html.Thead(html.Tr([html.Th(col) for col in columns])),
         html.Tbody([
-            html.Tr([html.Td(updated_data.iloc[i][col]) for col in updated_data.columns])
-            for i in range(min(len(updated_data), 10))  # Display first 10 rows
+            html.Tr([html.Td(value) for value in row])
+            for row in aggregates['first']  # Display first 10 rows
         ])
     ])
 
@@ -1,114 +1,51 @@
 import dash
 from dash import dcc, html, Input, Output, State
-import plotly.express as px
-import pandas as pd
-from tensorflow.keras.preprocessing.image import img_to_array
-from tensorflow.keras.models import load_model
-import numpy as np
-import cv2
-import cvlib as cv
-import os
-import csv
+from aggregates import get_aggregates
+from detection_service import DetectionService, add_job_api, QUEUED, RUNNING, FAILED
+import figures
 
-# Load gender detection model
-gender_model = load_model('gender_detection.h5')
+# Predictions file the detection service writes and the dashboard reads
+filename = 'predictions.csv'
 
-# Load age detection model
-age_model = load_model('age_detection.h5')
+# Detection runs on the service thread, which keeps the camera open between clicks
+# The camera and the models are only opened on the first detection
+service = DetectionService(source=0, filename=filename)
 
-# Define gender and age categories
-gender_classes = ['man', 'woman']
-age_categories = ['0-12', '13-25', '26-35', '36-45', '46-55', '56-65', '66-75', '76+']
-
-# Function to append a new prediction to the CSV file
-def append_prediction_to_csv(age, gender, filename='predictions.csv'):
-    # Check if the file exists
-    if not os.path.isfile(filename):
-        # If file does not exist, create it with headers
-        with open(filename, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Predicted_Age', 'Predicted_Gender'])
-
-    # Append the new prediction
-    with open(filename, 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([age, gender])
-
-# Function to perform gender and age detection
-def detect_gender_age():
-    # Open webcam
-    webcam = cv2.VideoCapture(0)
-
-    # Read frame from webcam 
-    status, frame = webcam.read()
-
-    if status:
-        # Apply face detection
-        face, confidence = cv.detect_face(frame)
-
-        # Loop through detected faces
-        for idx, f in enumerate(face):
-
-            # Crop the detected face region
-            face_crop = np.copy(frame[f[1]:f[3], f[0]:f[2]])
-
-            if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
-                continue
-
-            # Preprocessing for gender and age detection models
-            face_crop = cv2.resize(face_crop, (96, 96))
-            face_crop = face_crop.astype("float") / 255.0
-            face_crop = img_to_array(face_crop)
-            face_crop = np.expand_dims(face_crop, axis=0)
-
-            # Apply gender detection on face
-            gender_conf = gender_model.predict(face_crop)[0]
-            gender_idx = np.argmax(gender_conf)
-            gender_label = gender_classes[gender_idx]
-
-            # Apply age detection on face
-            age_conf = age_model.predict(face_crop)[0]
-            age_idx = np.argmax(age_conf)
-            age_label = age_categories[age_idx]
-
-            # Append prediction to CSV
-            append_prediction_to_csv(age_label, gender_label)
-
-        # Release resources
-        webcam.release()
-
-# Load data
-data = pd.read_csv('predictions.csv')
+# Load running counts
+aggregates = get_aggregates(filename)
 
 # Calculate statistics
-total_count = len(data)
-male_count = (data['Predicted_Gender'] == 'man').sum()
-female_count = (data['Predicted_Gender'] == 'woman').sum()
-age_distribution = data['Predicted_Age'].value_counts()
+total_count = aggregates['total']
+male_count = aggregates['gender'].get('man', 0)
+female_count = aggregates['gender'].get('woman', 0)
 
 # Define app
 app = dash.Dash(__name__)
+add_job_api(app.server, service)
 
 # Define layout
 app.layout = html.Div([
     html.H1("Age and Gender Prediction Dashboard"),
     
     html.Button("Detect Gender and Age", id="detect-button", n_clicks=0),
+    html.P(id="job-status"),
+    dcc.Store(id="job-id"),
+    dcc.Interval(id="job-poll", interval=500, disabled=True),
     
     html.Div([
         html.Div([
             html.H4("Total Count"),
-            html.P(f"{total_count}")
+            html.P(f"{total_count}", id="total-count")
         ], className="card-body"),
 
         html.Div([
             html.H4("Male Count"),
-            html.P(f"{male_count}")
+            html.P(f"{male_count}", id="male-count")
         ], className="card-body"),
 
         html.Div([
             html.H4("Female Count"),
-            html.P(f"{female_count}")
+            html.P(f"{female_count}", id="female-count")
         ], className="card-body")
     ], className="row mb-4"),
 
@@ -125,33 +62,48 @@ app.layout = html.Div([
     ], className="row")
 ])
 
-# Callback to detect gender and age on button click
+# Callback to queue a detection job on button click, returns at once with the job id
+@app.callback(
+    Output('job-id', 'data'),
+    Output('job-poll', 'disabled'),
+    Input('detect-button', 'n_clicks'),
+    prevent_initial_call=True
+)
+def submit_detection(n_clicks):
+    return service.submit(), False
+
+
+# Callback to show the state of the last job and the charts from the cached counts
+# Runs on every poll while a job is in flight, never touching the camera or the models
 @app.callback(
+    Output('job-status', 'children'),
+    Output('job-poll', 'disabled', allow_duplicate=True),
     Output('gender-pie-chart', 'figure'),
     Output('age-bar-chart', 'figure'),
-    Input('detect-button', 'n_clicks')
+    Output('total-count', 'children'),
+    Output('male-count', 'children'),
+    Output('female-count', 'children'),
+    Input('job-poll', 'n_intervals'),
+    State('job-id', 'data'),
+    prevent_initial_call=True
 )
-def update_charts(n_clicks):
-    print("Button clicked:", n_clicks)
-    if n_clicks > 0:
-        detect_gender_age()
-        print("Detection completed")
-        # Reload data
-        data = pd.read_csv('predictions.csv')
-        print("Data loaded")
-        # Update statistics
-        total_count = len(data)
-        male_count = (data['Predicted_Gender'] == 'man').sum()
-        female_count = (data['Predicted_Gender'] == 'woman').sum()
-        age_distribution = data['Predicted_Age'].value_counts()
-        print("Statistics updated")
-        # Update charts
-        gender_fig = px.pie(names=['Male', 'Female'], values=[male_count, female_count], title='Gender Distribution')
-        age_fig = px.bar(x=age_distribution.index, y=age_distribution.values, title='Age Distribution')
-        print("Charts updated")
-        return gender_fig, age_fig
+def update_charts(n_intervals, job_id):
+    job = service.status(job_id) if job_id is not None else None
+    if job is None:
+        return "No detection running", True, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    if job['state'] in (QUEUED, RUNNING):
+        return "Detection {} {}".format(job_id, job['state']), False, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    if job['state'] == FAILED:
+        status = "Detection {} failed: {}".format(job_id, job['error'])
     else:
-        return {}, {}
+        status = "Detection {} found {} faces in {:.2f}s".format(job_id, job['faces'], job['duration'])
+
+    # Count the newly appended rows
+    aggregates = get_aggregates(filename)
+    gender_fig = figures.gender_pie(aggregates, title='Gender Distribution', names={'man': 'Male', 'woman': 'Female'})
+    age_fig = figures.age_bar(aggregates, title='Age Distribution')
+    return (status, True, gender_fig, age_fig, f"{aggregates['total']}",
+            f"{aggregates['gender'].get('man', 0)}", f"{aggregates['gender'].get('woman', 0)}")
 
 # Run app
 if __name__ == '__main__':
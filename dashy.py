@@ -1,104 +1,84 @@
 import dash
-from dash import html, dcc, callback, Output, Input
-import pandas as pd
-import plotly.express as px
+from dash import html, dcc
+from live_updates import add_live_updates, script_url
+import figures
 
-# Initialize the Dash app
-app = dash.Dash(__name__)
-
-# Define the layout
-app.layout = html.Div([
-    html.H1("Age and Gender Prediction Dashboard", style={'text-align': 'center'}),
-
-    # Add a button to manually update data
-    html.Button("Update Data", id="update-button", n_clicks=0, style={'margin': '20px'}),
+# Predictions file the dashboard follows
+filename = 'predictions.csv'
 
-    # Statistics Section
-    html.Div([
-        html.H2("Statistics", style={'text-align': 'center'}),
-        html.Div(id="statistics-display", style={'margin': '20px'})
-    ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
+# Figures of the dashboard by graph id, rebuilt by the live publisher whenever new rows arrive
+graphs = {
+    'bar-chart': lambda aggregates: figures.age_gender_bar(aggregates, title='Age Group Distribution by Gender'),
+    'pie-chart': lambda aggregates: figures.gender_pie(aggregates, title='Gender Distribution'),
+    'histogram': lambda aggregates: figures.age_gender_bar(aggregates, title='Age Distribution', barmode='overlay'),
+    'box-plot': lambda aggregates: figures.age_box(aggregates, title='Age Distribution by Gender'),
+}
 
-    # Plots Section
-    html.Div([
-        html.H2("Plots", style={'text-align': 'center'}),
-        # Add a div for the bar chart
-        dcc.Graph(id='bar-chart', style={'margin': '20px'}),
-        # Add a div for the pie chart
-        dcc.Graph(id='pie-chart', style={'margin': '20px'}),
-        # Add a div for the histogram
-        dcc.Graph(id='histogram', style={'margin': '20px'}),
-        # Add a div for the box plot
-        dcc.Graph(id='box-plot', style={'margin': '20px'})
-    ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
 
-    # Recent Data Section
-    html.Div([
-        html.Div([
-            html.H2("Recent Data", style={'text-align': 'center', 'margin-bottom': '10px'}),
-        ], style={'margin-bottom': '20px'}),
-        html.Div(id="data-display", style={'margin': '20px'})
-    ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
-])
-
-# Define callback to update data and graphs
-@app.callback(
-    [Output("data-display", "children"),
-     Output("bar-chart", "figure"),
-     Output("pie-chart", "figure"),
-     Output("histogram", "figure"),
-     Output("box-plot", "figure"),
-     Output("statistics-display", "children")],
-    [Input("update-button", "n_clicks")]
-)
-def update_data(n_clicks):
-    # Read updated data from CSV
-    updated_data = pd.read_csv('predictions.csv')
+# Function to calculate the statistics, by element id
+def statistics(aggregates):
+    return {
+        'total-count': f"{aggregates['total']}",
+        'male-count': f"{aggregates['gender'].get('man', 0)}",
+        'female-count': f"{aggregates['gender'].get('woman', 0)}",
+        'age-group-counts': [f"{age_group}: {count}" for age_group, count in aggregates['age'].items()],
+    }
 
-    # Select the most recent 10 rows of the data
-    recent_data = updated_data.tail(10)
 
-    # Generate bar chart
-    bar_fig = px.bar(updated_data, x='Predicted_Age', color='Predicted_Gender', barmode='group',
-                     title='Age Group Distribution by Gender')
+# Function to build the page with the current data, later changes are pushed to the browser
+def layout():
+    aggregates = publisher.current()
+    stats = statistics(aggregates)
 
-    # Generate pie chart
-    pie_fig = px.pie(updated_data, names='Predicted_Gender', title='Gender Distribution')
+    return html.Div(id='live-dashboard', children=[
+        html.H1("Age and Gender Prediction Dashboard", style={'text-align': 'center'}),
 
-    # Generate histogram
-    hist_fig = px.histogram(updated_data, x='Predicted_Age', color='Predicted_Gender', barmode='overlay',
-                            title='Age Distribution')
+        # Statistics Section
+        html.Div([
+            html.H2("Statistics", style={'text-align': 'center'}),
+            html.Div([
+                html.P(["Total People: ", html.Span(stats['total-count'], id='total-count')]),
+                html.P(["Number of Males: ", html.Span(stats['male-count'], id='male-count')]),
+                html.P(["Number of Females: ", html.Span(stats['female-count'], id='female-count')]),
+                html.P("Age Group Distribution:"),
+                html.Ul([html.Li(line) for line in stats['age-group-counts']], id='age-group-counts')
+            ], style={'margin': '20px'})
+        ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
+
+        # Plots Section
+        html.Div([
+            html.H2("Plots", style={'text-align': 'center'}),
+            *[dcc.Graph(id=graph_id, figure=build(aggregates), style={'margin': '20px'})
+              for graph_id, build in graphs.items()]
+        ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
 
-    # Generate box plot
-    box_fig = px.box(updated_data, x='Predicted_Gender', y='Predicted_Age', color='Predicted_Gender',
-                     title='Age Distribution by Gender')
+        # Recent Data Section
+        html.Div([
+            html.Div([
+                html.H2("Recent Data", style={'text-align': 'center', 'margin-bottom': '10px'}),
+            ], style={'margin-bottom': '20px'}),
+            html.Div([
+                html.Table([
+                    html.Thead(html.Tr([html.Th(col) for col in aggregates['columns']])),
+                    html.Tbody([
+                        html.Tr([html.Td(value) for value in row])
+                        for row in aggregates['recent']  # Display recent 10 rows
+                    ])
+                ], id='recent-table', style={'width': '100%', 'border': '1px solid black', 'border-collapse': 'collapse'})
+            ], style={'margin': '20px'})
+        ], style={'border': '1px solid #ddd', 'border-radius': '5px', 'margin': '20px', 'padding': '20px'}),
+    ])
 
-    # Calculate statistics
-    total_count = len(updated_data)
-    male_count = len(updated_data[updated_data['Predicted_Gender'] == 'man'])
-    female_count = len(updated_data[updated_data['Predicted_Gender'] == 'woman'])
-    age_group_counts = updated_data['Predicted_Age'].value_counts().to_dict()
 
-    # Display updated data and statistics
-    data_table = html.Div([
-        html.Table([
-            html.Thead(html.Tr([html.Th(col) for col in recent_data.columns])),
-            html.Tbody([
-                html.Tr([html.Td(recent_data.iloc[i][col]) for col in recent_data.columns])
-                for i in range(len(recent_data))  # Display recent 10 rows
-            ])
-        ], style={'width': '100%', 'border': '1px solid black', 'border-collapse': 'collapse'})
-    ])
+# Initialize the Dash app
+app = dash.Dash(__name__, external_scripts=[script_url])
 
-    statistics = html.Div([
-        html.P(f"Total People: {total_count}"),
-        html.P(f"Number of Males: {male_count}"),
-        html.P(f"Number of Females: {female_count}"),
-        html.P("Age Group Distribution:"),
-        html.Ul([html.Li(f"{age_group}: {count}") for age_group, count in age_group_counts.items()])
-    ])
+# Push new counts, patched figures and new rows to every open page as predictions are written,
+# instead of each viewer clicking "Update Data" and re-reading the data
+publisher = add_live_updates(app, filename, graphs, stats=statistics, table='recent-table')
 
-    return data_table, bar_fig, pie_fig, hist_fig, box_fig, statistics
+# Define the layout, built again for every page load
+app.layout = layout
 
 # Run the app
 if __name__ == '__main__':
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+
+import numpy as np
+import cv2
+
+from inference import img_dims, gender_classes
+
+# Files of a dataset cache directory
+images_file = 'images.npy'
+labels_file = 'labels.npy'
+manifest_file = 'manifest.json'
+
+
+# Function to list the images of a dataset laid out as <dataset_dir>/<label>/<image>, e.g. the gender
+# dataset's man/ and woman/ folders, labelled with the index of their folder in classes
+def list_labelled_images(dataset_dir, classes=gender_classes):
+    samples = []
+    for label, name in enumerate(classes):
+        folder = os.path.join(dataset_dir, name)
+        for root, dirs, files in os.walk(folder):
+            samples.extend((os.path.join(root, file), label) for file in sorted(files))
+    return sorted(samples)
+
+
+# Function to read and resize one image, returns None for files OpenCV can't decode
+def decode(path):
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    return cv2.resize(image, (img_dims[0], img_dims[1]))
+
+
+# Function to identify a list of samples, so a cache is rebuilt when files are added, changed or relabelled
+def signature(samples):
+    digest = hashlib.sha1()
+    for sample in samples:
+        stat = os.stat(sample[0])
+        digest.update(repr((sample, stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+# Function to decode and resize every image once into a uint8 memory-mapped array
+# samples are (path, label, ...) tuples; images are decoded on a process pool and written straight to
+# disk, so memory stays flat whatever the dataset size. Unreadable images are left out.
+def build_cache(samples, cache_dir, workers=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    images_path = os.path.join(cache_dir, images_file)
+    images = np.lib.format.open_memmap(images_path + '.tmp', mode='w+', dtype=np.uint8,
+                                       shape=(len(samples),) + img_dims)
+    labels = np.empty((len(samples), len(samples[0]) - 1 if samples else 0), dtype=np.int64)
+
+    count = 0
+    # spawn rather than fork, the trainers may already have TensorFlow loaded (scripts need the usual
+    # if __name__ == '__main__' guard)
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        paths = [sample[0] for sample in samples]
+        for sample, image in zip(samples, pool.imap(decode, paths, chunksize=64)):
+            if image is None:
+                continue
+            images[count] = image
+            labels[count] = sample[1:]
+            count += 1
+    images.flush()
+    del images
+
+    os.replace(images_path + '.tmp', images_path)
+    np.save(os.path.join(cache_dir, labels_file), labels[:count])
+    with open(os.path.join(cache_dir, manifest_file), 'w') as file:
+        json.dump({'count': count, 'img_dims': list(img_dims), 'signature': signature(samples)}, file)
+    return count
+
+
+# Function to open a dataset cache, building it first when it is missing or out of date
+# Returns (images, labels) with images a read-only memmap of shape (n, 96, 96, 3) and labels (n, k)
+def load_cache(samples, cache_dir, workers=None):
+    manifest_path = os.path.join(cache_dir, manifest_file)
+    manifest = None
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    if manifest is None or manifest['img_dims'] != list(img_dims) or manifest['signature'] != signature(samples):
+        print("Building dataset cache in {} from {} images".format(cache_dir, len(samples)))
+        build_cache(samples, cache_dir, workers)
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    images = np.load(os.path.join(cache_dir, images_file), mmap_mode='r')[:manifest['count']]
+    labels = np.load(os.path.join(cache_dir, labels_file))
+    return images, labels
+
+
+# Function to randomly rotate, shift, shear, zoom and flip a batch of images on the fly, with the
+# same ranges as the ImageDataGenerator the trainers used (rotation_range=25, width/height_shift_range=0.1,
+# shear_range=0.2, zoom_range=0.2, horizontal_flip=True, fill_mode="nearest")
+# All transforms are combined into one projective transform per image
+def augment_batch(images, rotation=25.0, shift=0.1, shear=0.2, zoom=0.2, flip=True):
+    import tensorflow as tf
+
+    n = tf.shape(images)[0]
+    height = tf.cast(tf.shape(images)[1], tf.float32)
+    width = tf.cast(tf.shape(images)[2], tf.float32)
+
+    # ImageDataGenerator takes the rotation and shear ranges in degrees
+    angle = tf.random.uniform([n], -rotation, rotation) * (math.pi / 180.0)
+    shear_angle = tf.random.uniform([n], -shear, shear) * (math.pi / 180.0)
+    shift_x = tf.random.uniform([n], -shift, shift) * width
+    shift_y = tf.random.uniform([n], -shift, shift) * height
+    zoom_x = tf.random.uniform([n], 1.0 - zoom, 1.0 + zoom)
+    zoom_y = tf.random.uniform([n], 1.0 - zoom, 1.0 + zoom)
+    flip_x = tf.where(tf.random.uniform([n]) < 0.5, -1.0, 1.0) if flip else tf.ones([n])
+
+    # Matrix mapping output to input pixels around the image centre: rotation . shear . zoom . flip
+    a0 = tf.cos(angle) * zoom_x * flip_x
+    a1 = -tf.sin(angle + shear_angle) * zoom_y
+    b0 = tf.sin(angle) * zoom_x * flip_x
+    b1 = tf.cos(angle + shear_angle) * zoom_y
+    center_x = (width - 1.0) / 2.0
+    center_y = (height - 1.0) / 2.0
+    a2 = center_x + shift_x - (a0 * center_x + a1 * center_y)
+    b2 = center_y + shift_y - (b0 * center_x + b1 * center_y)
+    zeros = tf.zeros([n])
+    transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images, transforms=transforms, output_shape=tf.shape(images)[1:3], fill_value=0.0,
+        interpolation="BILINEAR", fill_mode="NEAREST")
+
+
+# Function to stream batches of (images, targets) from a cache with tf.data
+# targets is one array or a dict of arrays (e.g. {"gender": ..., "age": ...}) indexed like images;
+# indices picks the rows to use (e.g. a train or validation split). Batches are gathered from the
+# memmap in parallel, augmented when augment is set, normalised to float32 / 255 and prefetched.
+def make_dataset(images, targets, indices, batch_size, augment=False, shuffle=False):
+    import tensorflow as tf
+
+    flat_targets = tf.nest.flatten(targets)
+
+    # Reads one batch from the memmap, in file order to keep the reads sequential
+    def gather(batch_indices):
+        batch_indices = np.sort(batch_indices)
+        return [np.asarray(images[batch_indices])] + [target[batch_indices] for target in flat_targets]
+
+    def load(batch_indices):
+        batch = tf.numpy_function(gather, [batch_indices],
+                                  [tf.uint8] + [tf.as_dtype(target.dtype) for target in flat_targets])
+        batch_images = tf.ensure_shape(batch[0], (None,) + tuple(images.shape[1:]))
+        batch_targets = [tf.ensure_shape(t, (None,) + target.shape[1:]) for t, target in zip(batch[1:], flat_targets)]
+        return batch_images, tf.nest.pack_sequence_as(targets, batch_targets)
+
+    def normalise(batch_images, batch_targets):
+        batch_images = tf.cast(batch_images, tf.float32)
+        if augment:
+            batch_images = augment_batch(batch_images)
+        return batch_images / 255.0, batch_targets
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.map(normalise, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+if __name__ == '__main__':
+    import argparse
+    import utkface
+
+    parser = argparse.ArgumentParser(description='Decode and resize a training dataset once into a memory-mapped cache')
+    parser.add_argument('dataset', help='UTKFace directory, or a directory with one folder per gender')
+    parser.add_argument('--cache', default=None, help='cache directory, <dataset>_cache by default')
+    parser.add_argument('--utkface', action='store_true', help='label images from their UTKFace filenames')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    samples = utkface.list_images(args.dataset) if args.utkface else list_labelled_images(args.dataset)
+    images, labels = load_cache(samples, args.cache or args.dataset.rstrip('/\\') + '_cache', args.workers)
+    print("{} images cached ({:.1f} MB)".format(len(images), images.nbytes / 1e6))
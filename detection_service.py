@@ -0,0 +1,187 @@
+import collections
+import itertools
+import queue
+import threading
+import time
+
+import cv2
+
+from inference import predict_faces
+from model_registry import registry, get_models
+from pipeline import StageQueue, BLOCK
+from prediction_sink import PredictionWriter
+from detectors import load_detector
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# Long-lived detection service: keeps the camera open and runs detection jobs on its own thread
+# submit() only queues a job and returns its id, callers poll status() for the result, so a web
+# request never waits for the camera or the models. Between jobs the camera buffer is drained with
+# grab(), so a job classifies a fresh frame instead of one buffered seconds ago. Predictions are
+# appended to filename, where the dashboards' aggregators pick them up.
+class DetectionService(threading.Thread):
+    def __init__(self, source=0, filename='predictions.csv', max_pending=4, max_jobs=100, grab_interval=0.03):
+        super().__init__(name='detection-service', daemon=True)
+        self.source = source
+        self.filename = filename
+        self.grab_interval = grab_interval
+
+        self.jobs = StageQueue(maxsize=max_pending, drop_policy=BLOCK)
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        # Only the last max_jobs jobs are kept for status(), older ids report as unknown
+        self.results = collections.OrderedDict()
+        self.max_jobs = max_jobs
+        self.pending = None
+        self.last_done = None
+
+        self.start_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.writer = None
+        self.capture = None
+        self.detector = None
+        self.completed = 0
+        self.failed = 0
+        self.camera_opened_at = None
+
+    # Function to start the service on first use, so importing an app doesn't open the camera
+    def ensure_started(self):
+        with self.start_lock:
+            if not self.is_alive() and not self.stopped.is_set():
+                registry.start()
+                self.start()
+
+    # Function to queue a detection job, returns its id
+    # Clicks arriving while a job is still queued share it instead of queueing duplicate work
+    def submit(self):
+        self.ensure_started()
+        with self.lock:
+            if self.pending is not None:
+                return self.pending
+            job_id = next(self.job_ids)
+            self.results[job_id] = {'id': job_id, 'state': QUEUED, 'submitted': time.time()}
+            while len(self.results) > self.max_jobs:
+                self.results.popitem(last=False)
+            self.pending = job_id
+        self.jobs.put(job_id)
+        return job_id
+
+    # Function to get a copy of the state of a job, None for unknown ids
+    def status(self, job_id):
+        with self.lock:
+            job = self.results.get(job_id)
+            return dict(job) if job is not None else None
+
+    # Function to get the last finished job, None before the first one
+    def latest(self):
+        with self.lock:
+            return dict(self.results[self.last_done]) if self.last_done in self.results else None
+
+    def update(self, job_id, **values):
+        with self.lock:
+            if job_id in self.results:
+                self.results[job_id].update(values)
+
+    def run(self):
+        self.writer = PredictionWriter(self.filename)
+        self.capture = cv2.VideoCapture(self.source)
+        self.camera_opened_at = time.time()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    job_id = self.jobs.get(timeout=self.grab_interval)
+                except queue.Empty:
+                    # Idle: drop buffered frames without decoding them
+                    self.capture.grab()
+                    continue
+
+                with self.lock:
+                    if self.pending == job_id:
+                        self.pending = None
+                self.run_job(job_id)
+        finally:
+            self.capture.release()
+            self.writer.close()
+
+    def run_job(self, job_id):
+        self.update(job_id, state=RUNNING, started=time.time())
+        start = time.perf_counter()
+        try:
+            predictions = self.detect()
+        except Exception as error:
+            self.failed += 1
+            self.update(job_id, state=FAILED, error=str(error), finished=time.time(),
+                        duration=time.perf_counter() - start)
+            return
+
+        self.completed += 1
+        self.update(job_id, state=DONE, finished=time.time(), duration=time.perf_counter() - start,
+                    faces=len(predictions), predictions=predictions)
+        with self.lock:
+            self.last_done = job_id
+
+    # Function to classify the faces of the current camera frame and record the predictions
+    # The face detector (cvlib imports TensorFlow) is only loaded here, on the service thread
+    def detect(self):
+        if self.detector is None:
+            self.detector = load_detector()
+
+        status, frame = self.capture.read()
+        if not status:
+            raise RuntimeError("Could not read a frame from camera {}".format(self.source))
+
+        face, confidence = self.detector(frame)
+        gender_model, age_model = get_models()
+        predictions = []
+        for f, prediction in zip(face, predict_faces(frame, face, gender_model, age_model)):
+            # Skip faces that were too small to classify
+            if prediction is None:
+                continue
+            age_label, age_conf, gender_label, gender_conf = prediction
+            self.writer.write([age_label, gender_label])
+            predictions.append({'box': [int(v) for v in f], 'age': age_label, 'age_conf': float(age_conf),
+                                'gender': gender_label, 'gender_conf': float(gender_conf)})
+
+        # Make the rows visible to the dashboards before the job is reported done
+        self.writer.flush()
+        return predictions
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        return {
+            'running': self.is_alive(),
+            'camera_opened_at': self.camera_opened_at,
+            'queued': self.jobs.depth(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'models_ready': registry.ready(),
+        }
+
+
+# Function to add the job/status API of a detection service to a Flask server
+# POST /jobs queues a job, GET /jobs/<id> returns its state and GET /jobs returns the service stats
+def add_job_api(server, service, route='/jobs'):
+    from flask import jsonify
+
+    def submit():
+        return jsonify({'id': service.submit()}), 202
+
+    def status(job_id):
+        job = service.status(job_id)
+        if job is None:
+            return jsonify({'error': 'unknown job {}'.format(job_id)}), 404
+        return jsonify(job)
+
+    def stats():
+        return jsonify(service.stats())
+
+    server.add_url_rule(route, 'submit_job', submit, methods=['POST'])
+    server.add_url_rule(route + '/<int:job_id>', 'job_status', status)
+    server.add_url_rule(route, 'service_stats', stats, methods=['GET'])
@@ -0,0 +1,144 @@
+import importlib.util
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Face detector backends
+# Every detector is called like cvlib.detect_face, detector(frame) -> (faces, confidences), with faces
+# as [x1, y1, x2, y2] boxes in the coordinates of frame
+
+# Detector the scripts use: cvlib, ssd, haar or yunet
+face_detector = os.environ.get('FACE_DETECTOR', 'cvlib')
+
+# Width frames are downscaled to for detection (0 to detect at the frame's own size), see ScaledDetector
+detect_width = int(os.environ.get('DETECT_WIDTH', '0'))
+
+# YuNet model from the OpenCV model zoo (models/face_detection_yunet)
+yunet_model_path = os.environ.get('YUNET_MODEL', 'face_detection_yunet_2023mar.onnx')
+
+# cvlib keeps one global detector network, which must not run on two threads at once
+cvlib_lock = threading.Lock()
+
+
+# Function to get a model file shipped in the cvlib package, without importing cvlib (and TensorFlow)
+def cvlib_data(name):
+    spec = importlib.util.find_spec('cvlib')
+    if spec is None:
+        raise ImportError("cvlib is needed for the {} model file".format(name))
+    return os.path.join(spec.submodule_search_locations[0], 'data', name)
+
+
+# cvlib.detect_face: a ResNet-10 SSD run through OpenCV's DNN module on a 300x300 blob
+# All instances share cvlib's network, calls are serialized; use SsdDetector for one network per thread
+class CvlibDetector:
+    def __init__(self, threshold=0.5):
+        import cvlib
+        self.detect_face = cvlib.detect_face
+        self.threshold = threshold
+
+    def __call__(self, frame):
+        with cvlib_lock:
+            return self.detect_face(frame, threshold=self.threshold)
+
+
+# The same SSD model as cvlib with its own cv2.dnn network, so detectors on different threads run in parallel
+class SsdDetector:
+    def __init__(self, threshold=0.5, prototxt=None, caffemodel=None):
+        self.net = cv2.dnn.readNetFromCaffe(prototxt or cvlib_data('deploy.prototxt'),
+                                            caffemodel or cvlib_data('res10_300x300_ssd_iter_140000.caffemodel'))
+        self.threshold = threshold
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104.0, 177.0, 123.0)))
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= self.threshold]
+        boxes = (detections[:, 3:7] * np.array([width, height, width, height])).astype(int)
+        return boxes.tolist(), detections[:, 2].tolist()
+
+
+# OpenCV Haar cascade, the approach the README describes: fastest on CPU, frontal faces only
+# The cascade has no confidence score, every face gets 1.0
+class HaarDetector:
+    def __init__(self, cascade='haarcascade_frontalface_default.xml', scale_factor=1.1, min_neighbors=5,
+                 min_size=(24, 24)):
+        path = cascade if os.path.isfile(cascade) else os.path.join(cv2.data.haarcascades, cascade)
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise IOError("Could not load the Haar cascade {}".format(path))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def __call__(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=self.min_size)
+        faces = [[int(x), int(y), int(x + w), int(y + h)] for x, y, w, h in boxes]
+        return faces, [1.0] * len(faces)
+
+
+# OpenCV's YuNet detector (cv2.FaceDetectorYN), runs at the frame's own size
+class YuNetDetector:
+    def __init__(self, threshold=0.6, model_path=None, nms_threshold=0.3, top_k=5000):
+        model_path = model_path or yunet_model_path
+        if not os.path.isfile(model_path):
+            raise IOError("YuNet model not found at {}, download face_detection_yunet_2023mar.onnx from the "
+                          "OpenCV model zoo or set YUNET_MODEL".format(model_path))
+        self.detector = cv2.FaceDetectorYN.create(model_path, '', (320, 320), threshold, nms_threshold, top_k)
+        self.input_size = None
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        if self.input_size != (width, height):
+            self.detector.setInputSize((width, height))
+            self.input_size = (width, height)
+        status, detections = self.detector.detect(frame)
+        if detections is None:
+            return [], []
+        faces = [[int(x), int(y), int(x + w), int(y + h)] for x, y, w, h in detections[:, :4]]
+        return faces, detections[:, -1].tolist()
+
+
+# Detector run on a copy of the frame downscaled to width pixels, with the boxes mapped back to the
+# coordinates of the full frame, so classification still crops the faces at full resolution
+# Frames already at most width pixels wide are detected as they are
+class ScaledDetector:
+    def __init__(self, detector, width=320):
+        self.detector = detector
+        self.width = width
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        if width <= self.width:
+            return self.detector(frame)
+
+        scale = width / float(self.width)
+        small = cv2.resize(frame, (self.width, int(round(height / scale))), interpolation=cv2.INTER_AREA)
+        faces, confidences = self.detector(small)
+        mapped = []
+        for x1, y1, x2, y2 in faces:
+            mapped.append([max(0, int(x1 * scale)), max(0, int(y1 * scale)),
+                           min(width, int(x2 * scale)), min(height, int(y2 * scale))])
+        return mapped, confidences
+
+
+detectors = {
+    'cvlib': CvlibDetector,
+    'ssd': SsdDetector,
+    'haar': HaarDetector,
+    'yunet': YuNetDetector,
+}
+
+
+# Function to create a detector, downscaling frames to width pixels for detection when width is set
+# name and width default to the FACE_DETECTOR and DETECT_WIDTH environment variables
+def load_detector(name=None, width=None, **options):
+    name = name or face_detector
+    if name not in detectors:
+        raise ValueError("Unknown face detector: {}".format(name))
+    detector = detectors[name](**options)
+    width = detect_width if width is None else width
+    return ScaledDetector(detector, width) if width else detector
@@ -0,0 +1,151 @@
+from tensorflow.keras.models import load_model
+from backends import backend_path, load_backend
+from inference import img_dims, fused_model_path, gender_model_path, age_model_path
+import utkface
+import tensorflow as tf
+import numpy as np
+import argparse
+import json
+import os
+import time
+import cv2
+
+# Backends exported from every .h5 model, besides the Keras model itself
+export_backends = ['tflite', 'tflite-fp16', 'tflite-int8', 'onnx']
+
+
+# Function to load up to n UTKFace images with the inference preprocessing, with their labels
+# Falls back to random images (and no labels) when the dataset is not available
+def load_samples(dataset_dir, n):
+    samples = utkface.list_images(dataset_dir)[:n] if os.path.isdir(dataset_dir) else []
+    if not samples:
+        print("No UTKFace images found, using random images (accuracy is reported as agreement only)")
+        batch = np.random.default_rng(0).integers(0, 256, (n,) + img_dims).astype("float32") / 255.0
+        return batch, None, None
+
+    images = [cv2.resize(cv2.imread(path), (img_dims[0], img_dims[1])) for path, age, gender in samples]
+    batch = np.stack(images).astype("float32") / 255.0
+    return batch, np.array([gender for path, age, gender in samples]), np.array([age for path, age, gender in samples])
+
+
+# Function to convert a Keras model to TFLite, optionally with post-training quantization
+def export_tflite(model, path, mode, representative):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode == 'tflite-fp16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'tflite-int8':
+        # int8 weights and activations calibrated on real faces, float input and output
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for image in representative:
+                yield [image[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+    with open(path, 'wb') as file:
+        file.write(converter.convert())
+
+
+# Function to convert a Keras model to ONNX with a dynamic batch dimension
+def export_onnx(model, path):
+    import tf2onnx
+    spec = (tf.TensorSpec((None,) + img_dims, tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=path)
+
+
+# Function to export one .h5 model to every backend, skipping backends whose converter is missing
+def export(h5_path, representative):
+    model = load_model(h5_path)
+    exported = []
+    for backend in export_backends:
+        path = backend_path(h5_path, backend)
+        try:
+            if backend == 'onnx':
+                export_onnx(model, path)
+            else:
+                export_tflite(model, path, backend, representative)
+        except ImportError as e:
+            print("Skipping {} for {}: {}".format(backend, h5_path, e))
+            continue
+        print("Exported {} ({:.1f} MB)".format(path, os.path.getsize(path) / 1e6))
+        exported.append(backend)
+    return exported
+
+
+# Function to get [gender, age] confidences for a batch with the models of one backend
+def classify(models, batch, chunk=64):
+    outputs = [[], []]
+    for start in range(0, len(batch), chunk):
+        part = batch[start:start + chunk]
+        if len(models) == 1:
+            gender_conf, age_conf = models[0](part)
+        else:
+            gender_conf, age_conf = models[0](part), models[1](part)
+        outputs[0].append(gender_conf)
+        outputs[1].append(age_conf)
+    return np.concatenate(outputs[0]), np.concatenate(outputs[1])
+
+
+# Function to measure latency per batch and throughput in faces per second
+def measure(models, batch, batch_size, repeats=20):
+    part = batch[:batch_size]
+    classify(models, part)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        classify(models, part)
+    seconds = (time.perf_counter() - start) / repeats
+    return {'batch': batch_size, 'ms_per_batch': seconds * 1000.0, 'faces_per_second': len(part) / seconds}
+
+
+# Function to compare every backend against Keras on the same images
+def report(h5_paths, backends, batch, genders, ages):
+    reference = None
+    results = {}
+    for backend in ['keras'] + backends:
+        models = [load_backend(path, backend) for path in h5_paths]
+        gender_conf, age_conf = classify(models, batch)
+        if reference is None:
+            reference = (gender_conf, age_conf)
+
+        result = {
+            'gender_agreement': float(np.mean(np.argmax(gender_conf, 1) == np.argmax(reference[0], 1))),
+            'age_agreement': float(np.mean(np.argmax(age_conf, 1) == np.argmax(reference[1], 1))),
+            'max_abs_conf_delta': float(max(np.abs(gender_conf - reference[0]).max(), np.abs(age_conf - reference[1]).max())),
+            'latency': [measure(models, batch, 1), measure(models, batch, 16)],
+        }
+        if genders is not None:
+            result['gender_accuracy'] = float(np.mean(np.argmax(gender_conf, 1) == genders))
+            result['age_accuracy'] = float(np.mean(np.argmax(age_conf, 1) == ages))
+        results[backend] = result
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the age and gender models to TFLite/ONNX and compare backends')
+    parser.add_argument('--dataset', default='UTKFace')
+    parser.add_argument('--samples', type=int, default=500, help='images used for calibration and the report')
+    parser.add_argument('--report', default='backend_report.json')
+    args = parser.parse_args()
+
+    if os.path.isfile(fused_model_path):
+        h5_paths = [fused_model_path]
+    else:
+        h5_paths = [gender_model_path, age_model_path]
+
+    batch, genders, ages = load_samples(args.dataset, args.samples)
+    exported = None
+    for path in h5_paths:
+        backends = export(path, batch[:200])
+        exported = backends if exported is None else [b for b in exported if b in backends]
+
+    results = report(h5_paths, exported, batch, genders, ages)
+    with open(args.report, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    print("{:>12} {:>9} {:>9} {:>11} {:>12} {:>13}".format(
+        "backend", "gender =", "age =", "max delta", "ms @ b=1", "faces/s b=16"))
+    for backend, result in results.items():
+        print("{:>12} {:>9.3f} {:>9.3f} {:>11.4f} {:>12.2f} {:>13.0f}".format(
+            backend, result['gender_agreement'], result['age_agreement'], result['max_abs_conf_delta'],
+            result['latency'][0]['ms_per_batch'], result['latency'][1]['faces_per_second']))
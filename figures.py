@@ -0,0 +1,55 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+from aggregates import ordered_ages, ordered_genders, age_quartiles
+
+# The dashboard figures, built from aggregate snapshots (see aggregates.get_aggregates) instead of raw rows
+
+
+# Bar chart of age groups split by gender
+def age_gender_bar(snapshot, title='Age Group Distribution by Gender', barmode='group'):
+    ages = ordered_ages(snapshot)
+    genders = ordered_genders(snapshot)
+    rows = [(age, gender, snapshot['age_gender'].get((age, gender), 0)) for gender in genders for age in ages]
+    return px.bar(x=[row[0] for row in rows], y=[row[2] for row in rows], color=[row[1] for row in rows],
+                  barmode=barmode, title=title,
+                  labels={'x': 'Predicted_Age', 'y': 'count', 'color': 'Predicted_Gender'})
+
+
+# Pie chart of genders, names maps gender labels to display names
+def gender_pie(snapshot, title='Gender Distribution', names=None):
+    genders = ordered_genders(snapshot)
+    labels = [names.get(gender, gender) for gender in genders] if names else genders
+    return px.pie(names=labels, values=[snapshot['gender'][gender] for gender in genders], title=title)
+
+
+# Bar chart of age groups
+def age_bar(snapshot, title='Age Distribution'):
+    ages = sorted(snapshot['age'], key=snapshot['age'].get, reverse=True)
+    return px.bar(x=ages, y=[snapshot['age'][age] for age in ages], title=title)
+
+
+# Box plot of the age group per gender, from precomputed quartiles over the age bucket order
+def age_box(snapshot, title='Age Distribution by Gender'):
+    ages = ordered_ages(snapshot)
+    fig = go.Figure()
+    for gender in ordered_genders(snapshot):
+        counts = {age: snapshot['age_gender'].get((age, gender), 0) for age in ages}
+        quartiles = age_quartiles(counts, ages)
+        if quartiles is None:
+            continue
+        low, q1, median, q3, high = quartiles
+        fig.add_trace(go.Box(name=gender, x=[gender], lowerfence=[low], q1=[q1], median=[median],
+                             q3=[q3], upperfence=[high]))
+    fig.update_layout(title=title, xaxis_title='Predicted_Gender', yaxis_title='Predicted_Age')
+    fig.update_yaxes(tickvals=list(range(len(ages))), ticktext=ages)
+    return fig
+
+
+# Stacked bar chart of the gender split per time bucket, from a rollup query by bucket and gender
+# (see PredictionStore.query_rollup)
+def gender_over_time(counts, title='Gender Split over Time'):
+    fig = px.bar(counts, x='bucket', y='count', color='gender', title=title,
+                 labels={'bucket': 'Time', 'count': 'count', 'gender': 'Predicted_Gender'})
+    fig.update_layout(barmode='stack')
+    return fig
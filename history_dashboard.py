@@ -0,0 +1,57 @@
+import dash
+from dash import html, dcc, Input, Output
+from prediction_store import PredictionStore
+import figures
+import pandas as pd
+
+# Parquet store the history is read from, its rollups are built by `python prediction_store.py --rollup`
+store = PredictionStore('prediction_store')
+
+# Ranges offered on the page: (label, length, rollup granularity)
+# Long ranges read the hourly or daily rollups, so 90 days answer as fast as one hour
+ranges = {
+    '1h': ('Last hour', pd.Timedelta(hours=1), 'minute'),
+    '24h': ('Last 24 hours', pd.Timedelta(days=1), 'minute'),
+    '7d': ('Last 7 days', pd.Timedelta(days=7), 'hour'),
+    '90d': ('Last 90 days', pd.Timedelta(days=90), 'hour'),
+    '1y': ('Last year', pd.Timedelta(days=365), 'day'),
+}
+
+# Initialize the Dash app
+app = dash.Dash(__name__)
+
+# Define the layout
+app.layout = html.Div([
+    html.H1("Age and Gender Prediction History", style={'text-align': 'center'}),
+
+    dcc.RadioItems(id='range', options=[{'label': label, 'value': key} for key, (label, length, granularity) in ranges.items()],
+                   value='7d', inline=True, style={'margin': '20px'}),
+
+    html.Div(id='range-total', style={'margin': '20px'}),
+    dcc.Graph(id='gender-over-time'),
+    dcc.Graph(id='age-gender-bar'),
+])
+
+
+# Callback to draw the selected range from the rollups
+@app.callback(
+    Output('range-total', 'children'),
+    Output('gender-over-time', 'figure'),
+    Output('age-gender-bar', 'figure'),
+    Input('range', 'value')
+)
+def update_range(key):
+    label, length, granularity = ranges[key]
+    end = pd.Timestamp.now()
+    start = end - length
+
+    counts = store.query_rollup(granularity, start, end, by=['bucket', 'gender'])
+    snapshot = store.rollup_snapshot(granularity, start, end)
+    return (f"{label}: {snapshot['total']} predictions ({granularity} rollups)",
+            figures.gender_over_time(counts, title='Gender Split per {}'.format(granularity.capitalize())),
+            figures.age_gender_bar(snapshot, title='Age Group Distribution by Gender'))
+
+
+# Run the app
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,170 @@
+import numpy as np
+import cv2
+import os
+import threading
+import time
+
+from metrics import metrics
+
+# Define gender and age categories
+gender_classes = ['man', 'woman']
+age_categories = ['0-12', '13-25', '26-35', '36-45', '46-55', '56-65', '66-75', '76+']
+
+# Input size shared by the gender and age detection models
+img_dims = (96, 96, 3)
+
+# Model files, the fused two-head model is preferred when it exists
+gender_model_path = 'gender_detection.h5'
+age_model_path = 'age_detection.h5'
+fused_model_path = 'age_gender_detection.h5'
+
+# Backend the models run on: keras, tflite, tflite-fp16, tflite-int8 or onnx (see backends.py)
+model_backend = os.environ.get('MODEL_BACKEND', 'keras')
+
+
+# Function to load the age and gender models
+# Returns (fused_model, None) when the fused artifact exists, otherwise (gender_model, age_model)
+def load_models(fused_path=fused_model_path, gender_path=gender_model_path, age_path=age_model_path,
+                backend=None):
+    from backends import load_backend, backend_path
+
+    backend = backend or model_backend
+    if fused_path and os.path.isfile(backend_path(fused_path, backend)):
+        return load_backend(fused_path, backend), None
+
+    return load_backend(gender_path, backend), load_backend(age_path, backend)
+
+
+# Preallocated buffers faces are resized and normalised into, reused from frame to frame
+# Crops are resized straight into a uint8 slot and converted to float32 / 255 in one pass, so
+# no per-face temporaries are allocated; the buffers only grow when a batch has more faces
+class FaceBatcher:
+    def __init__(self, capacity=16):
+        self.resized = np.empty((capacity,) + img_dims, dtype=np.uint8)
+        self.batch = np.empty((capacity,) + img_dims, dtype=np.float32)
+
+    def reserve(self, size):
+        if size > len(self.batch):
+            capacity = max(size, 2 * len(self.batch))
+            self.resized = np.empty((capacity,) + img_dims, dtype=np.uint8)
+            self.batch = np.empty((capacity,) + img_dims, dtype=np.float32)
+
+    # Function to crop, resize and normalise every valid face of several frames into one NHWC batch
+    # Returns (batch, kept) with kept the (frame_idx, face_idx) of every batch row; the batch is a
+    # view of the buffer, valid until the next call
+    def __call__(self, frames):
+        self.reserve(sum(len(face) for frame, face in frames))
+        kept = []
+        for frame_idx, (frame, face) in enumerate(frames):
+            for idx, f in enumerate(face):
+
+                # Crop the detected face region
+                face_crop = frame[f[1]:f[3], f[0]:f[2]]
+
+                if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
+                    continue
+
+                cv2.resize(face_crop, (img_dims[0], img_dims[1]), dst=self.resized[len(kept)])
+                kept.append((frame_idx, idx))
+
+        batch = self.batch[:len(kept)]
+        np.divide(self.resized[:len(kept)], np.float32(255.0), out=batch, dtype=np.float32)
+        return batch, kept
+
+
+# One batcher per thread, so workers classifying in parallel don't share buffers
+batchers = threading.local()
+
+
+# Function to get the batcher of the calling thread
+def get_batcher():
+    if not hasattr(batchers, 'batcher'):
+        batchers.batcher = FaceBatcher()
+    return batchers.batcher
+
+
+# Function to crop, resize and normalise every valid face in a frame into one NHWC batch
+# Returns (batch, kept face indices); the batch is reused by the next call on the same thread
+def preprocess_faces(frame, face):
+    batch, kept = get_batcher()([(frame, face)])
+    return batch, [idx for frame_idx, idx in kept]
+
+
+# Function to run a model once on a whole batch, bypassing the per-call overhead of predict()
+def run_model(model, batch):
+    outputs = model(batch, training=False)
+    if isinstance(outputs, (list, tuple)):
+        return [np.asarray(output) for output in outputs]
+    return np.asarray(outputs)
+
+
+# Function to get gender and age confidences for a batch
+# With age_model set to None, gender_model is the fused model with [gender, age] outputs
+def classify_batch(batch, gender_model, age_model=None):
+    if age_model is None:
+        with metrics.timed('fused_predict'):
+            gender_conf, age_conf = run_model(gender_model, batch)
+        return gender_conf, age_conf
+
+    with metrics.timed('gender_predict'):
+        gender_conf = run_model(gender_model, batch)
+    with metrics.timed('age_predict'):
+        age_conf = run_model(age_model, batch)
+    return gender_conf, age_conf
+
+
+# Function to turn a row of model outputs into an (age_label, age_conf, gender_label, gender_conf) tuple
+def to_prediction(gender_conf, age_conf):
+    gender_idx = int(np.argmax(gender_conf))
+    age_idx = int(np.argmax(age_conf))
+    return (age_categories[age_idx], float(age_conf[age_idx]),
+            gender_classes[gender_idx], float(gender_conf[gender_idx]))
+
+
+# Function to predict age and gender for all faces of a frame with one call per model
+# Returns one (age_label, age_conf, gender_label, gender_conf) tuple per face, or None
+# for faces that were too small to classify
+def predict_faces(frame, face, gender_model, age_model=None, cache=None):
+    return predict_frames([(frame, face)], gender_model, age_model, cache)[0]
+
+
+# Function to predict age and gender for the faces of several frames (e.g. from different
+# cameras) with one call per model, returns one predict_faces() style list per frame
+# With a PredictionCache (see prediction_cache.py), faces whose crop and position match a recent
+# prediction reuse it and only the others are sent to the models
+def predict_frames(frames, gender_model, age_model=None, cache=None):
+    predictions = [[None] * len(face) for frame, face in frames]
+
+    batcher = get_batcher()
+    with metrics.timed('preprocess'):
+        batch, kept = batcher(frames)
+    if not kept:
+        return predictions
+
+    if cache is not None:
+        misses = []
+        for row, (frame_idx, idx) in enumerate(kept):
+            crop_hash, prediction = cache.get(batcher.resized[row], frames[frame_idx][1][idx])
+            if prediction is None:
+                misses.append((row, crop_hash))
+            else:
+                predictions[frame_idx][idx] = prediction
+        if not misses:
+            return predictions
+        rows = [row for row, crop_hash in misses]
+        if len(rows) < len(kept):
+            batch = batch[rows]
+            kept = [kept[row] for row in rows]
+
+    start = time.perf_counter()
+    gender_conf, age_conf = classify_batch(batch, gender_model, age_model)
+
+    for row, (frame_idx, idx) in enumerate(kept):
+        predictions[frame_idx][idx] = to_prediction(gender_conf[row], age_conf[row])
+
+    if cache is not None:
+        cache.add_model_time(time.perf_counter() - start, len(kept))
+        for (frame_idx, idx), (_, crop_hash) in zip(kept, misses):
+            cache.put(crop_hash, frames[frame_idx][1][idx], predictions[frame_idx][idx])
+
+    return predictions
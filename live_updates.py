@@ -0,0 +1,186 @@
+import json
+import queue
+import threading
+
+from flask import Response, stream_with_context
+
+from aggregates import get_aggregator, table_rows
+from pipeline import StageQueue, DROP_OLDEST
+
+# URL of the script that applies the pushed updates in the browser (static/live_updates.js)
+script_url = '/static/live_updates.js'
+
+# Trace attributes sent as patches, everything else only changes with a full figure
+patch_attributes = ['x', 'y', 'labels', 'values', 'lowerfence', 'q1', 'median', 'q3', 'upperfence']
+
+
+# In-process publish/subscribe for prediction events, the stand-in for a message broker
+# Every subscriber gets its own bounded queue; a subscriber that falls behind loses its oldest events
+# and is sent the full state instead (see event_stream), so one slow viewer never holds up the others
+class EventBus:
+    def __init__(self, queue_size=16):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def subscribe(self):
+        subscription = StageQueue(maxsize=self.queue_size, drop_policy=DROP_OLDEST)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+
+# Function to get what identifies the layout of a figure: a figure with the same trace names and
+# layout can be updated by patching its trace data, anything else needs the full figure
+def figure_structure(figure):
+    return [trace.get('name') for trace in figure['data']], figure['layout']
+
+
+# Function to get the trace data of a figure as a Plotly.restyle update, one list entry per trace
+def figure_patch(figure):
+    patch = {}
+    for attribute in patch_attributes:
+        if all(attribute in trace for trace in figure['data']):
+            patch[attribute] = [trace[attribute] for trace in figure['data']]
+    return {'patch': patch, 'traces': len(figure['data'])}
+
+
+# Thread that follows a predictions CSV and publishes what changed as one event for all viewers
+# graphs maps graph ids to functions building a figure from an aggregate snapshot, stats is a
+# function returning {element_id: text or list of lines} for the statistics, and table is the id
+# of the recent rows table. Figures are only built once per change, however many viewers there are.
+class LivePublisher(threading.Thread):
+    def __init__(self, filename, graphs, stats=None, table=None, interval=0.5, bus=None):
+        super().__init__(name='live-publisher', daemon=True)
+        self.aggregator = get_aggregator(filename)
+        self.graphs = graphs
+        self.stats = stats
+        self.table = table
+        self.interval = interval
+        self.bus = bus or EventBus()
+
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.snapshot = None
+        self.figures = {}
+        self.full_event = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.update()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+    # Function to count new rows and publish a delta event when there were any
+    def update(self):
+        new_rows = self.aggregator.refresh()
+        if new_rows == 0 and self.snapshot is not None:
+            return False
+
+        snapshot = self.aggregator.snapshot()
+        figures = {graph_id: json.loads(build(snapshot).to_json()) for graph_id, build in self.graphs.items()}
+
+        event = {'figures': {}}
+        for graph_id, figure in figures.items():
+            previous = self.figures.get(graph_id)
+            if previous is None or figure_structure(previous) != figure_structure(figure):
+                event['figures'][graph_id] = {'figure': figure}
+            else:
+                event['figures'][graph_id] = figure_patch(figure)
+        self.add_stats(event, snapshot)
+        if self.table:
+            reset = self.snapshot is None or new_rows > table_rows
+            rows = snapshot['recent'] if reset else snapshot['recent'][-new_rows:]
+            event['table'] = {'id': self.table, 'columns': snapshot['columns'], 'rows': rows,
+                              'reset': reset, 'limit': table_rows}
+
+        with self.lock:
+            self.seq += 1
+            self.snapshot = snapshot
+            self.figures = figures
+            self.full_event = None
+            event['seq'] = self.seq
+        self.bus.publish(json.dumps(event))
+        return True
+
+    def add_stats(self, event, snapshot):
+        if self.stats is None:
+            return
+        stats = self.stats(snapshot)
+        event['texts'] = {key: value for key, value in stats.items() if not isinstance(value, list)}
+        event['lists'] = {key: value for key, value in stats.items() if isinstance(value, list)}
+
+    # Function to get the snapshot the last event was built from, for rendering a page
+    # Pages must not refresh the aggregator themselves, or the rows they read would never be published
+    def current(self):
+        with self.lock:
+            return self.snapshot
+
+    # Function to get the whole current state as one event, for new viewers and ones that fell behind
+    def full_state(self):
+        with self.lock:
+            if self.full_event is None and self.snapshot is not None:
+                event = {'seq': self.seq, 'figures': {graph_id: {'figure': figure}
+                                                      for graph_id, figure in self.figures.items()}}
+                self.add_stats(event, self.snapshot)
+                if self.table:
+                    event['table'] = {'id': self.table, 'columns': self.snapshot['columns'],
+                                      'rows': self.snapshot['recent'], 'reset': True, 'limit': table_rows}
+                self.full_event = json.dumps(event)
+            return self.full_event
+
+    # Generator of server-sent events for one viewer: the full state first, then the deltas
+    def event_stream(self, keepalive=15.0):
+        subscription = self.bus.subscribe()
+        try:
+            full = self.full_state()
+            if full is not None:
+                yield "data: {}\n\n".format(full)
+            dropped = subscription.dropped
+            while True:
+                try:
+                    event = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped != dropped:
+                    dropped = subscription.dropped
+                    event = self.full_state()
+                yield "data: {}\n\n".format(event)
+        finally:
+            self.bus.unsubscribe(subscription)
+
+
+# Function to serve live updates for a Dash app: starts the publisher and adds the /events
+# server-sent events endpoint to the app's Flask server. The layout needs the script_url script
+# (external_scripts) and a root element with id 'live-dashboard'.
+def add_live_updates(app, filename, graphs, stats=None, table=None, interval=0.5, route='/events'):
+    publisher = LivePublisher(filename, graphs, stats=stats, table=table, interval=interval)
+    publisher.update()
+    publisher.start()
+
+    def events():
+        response = Response(stream_with_context(publisher.event_stream()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    app.server.add_url_rule(route, 'live_events', events)
+    return publisher
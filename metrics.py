@@ -0,0 +1,193 @@
+import atexit
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Number of recent samples the percentiles of a timer are computed from
+window = 1024
+
+# Percentiles reported for every timer
+quantiles = (0.5, 0.95, 0.99)
+
+
+# Latency of one step (e.g. detect_face, gender_predict), over all time and over the last window samples
+# observe() only appends to a bounded deque, the percentiles are computed when they are read
+class Timer:
+    def __init__(self, name, window=window):
+        self.name = name
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentiles(self, quantiles=quantiles):
+        samples = sorted(self.samples)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles}
+
+    def stats(self):
+        stats = {'count': self.count, 'total': self.total, 'mean': self.total / self.count if self.count else 0.0}
+        for q, value in self.percentiles().items():
+            stats['p{}'.format(int(q * 100))] = value
+        return stats
+
+
+# Context manager timing one use of a step
+class Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, self.start)
+        return False
+
+
+# Timers for the steps of the capture loop, plus gauges collected from the pipeline, detector and gate stats
+# Exposed as Prometheus text (render) on a local HTTP endpoint (serve), and optionally recorded as a
+# Chrome trace (chrome://tracing, Perfetto) of every timed span (trace_to)
+class Metrics:
+    def __init__(self):
+        self.timers = {}
+        self.lock = threading.Lock()
+        self.collectors = []
+        self.trace = None
+        self.trace_path = None
+        self.started_at = time.time()
+
+    def get_timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            with self.lock:
+                timer = self.timers.setdefault(name, Timer(name))
+        return timer
+
+    # Function to time a block: with metrics.timed('detect_face'): ...
+    def timed(self, name):
+        return Span(self, name)
+
+    # Function to record a step that started at start (a time.perf_counter() value) and ends now
+    # Returns the elapsed seconds
+    def observe(self, name, start):
+        end = time.perf_counter()
+        self.get_timer(name).observe(end - start)
+        if self.trace is not None:
+            self.trace.append((name, threading.current_thread().name, start, end))
+        return end - start
+
+    # Function to add a stats function (e.g. pipeline.stats) whose numbers are exported as gauges
+    # Nested dicts like {'detect': {'fps': ...}} become <prefix>_fps{stage="detect"}
+    def add_collector(self, prefix, stats):
+        self.collectors.append((prefix, stats))
+
+    # Function to record every span from now on, dumped to path as a Chrome trace (also at exit)
+    # Only the last max_events spans are kept
+    def trace_to(self, path, max_events=100000):
+        self.trace_path = path
+        self.trace = collections.deque(maxlen=max_events)
+        atexit.register(self.dump_trace)
+
+    def dump_trace(self, path=None):
+        path = path or self.trace_path
+        if path is None or self.trace is None:
+            return
+        origin = self.trace[0][2] if self.trace else 0.0
+        events = [{'name': name, 'ph': 'X', 'pid': 0, 'tid': thread,
+                   'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6}
+                  for name, thread, start, end in list(self.trace)]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def gauges(self):
+        gauges = []
+        for prefix, stats in self.collectors:
+            for key, value in stats().items():
+                if isinstance(value, dict):
+                    for name, number in value.items():
+                        if isinstance(number, (int, float)) and not isinstance(number, bool):
+                            gauges.append(('{}_{}'.format(prefix, name), {'stage': key}, number))
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges.append(('{}_{}'.format(prefix, key), {}, value))
+        return gauges
+
+    def stats(self):
+        with self.lock:
+            timers = dict(self.timers)
+        return {
+            'uptime': time.time() - self.started_at,
+            'timers': {name: timer.stats() for name, timer in timers.items()},
+            'gauges': [{'name': name, 'labels': labels, 'value': value} for name, labels, value in self.gauges()],
+        }
+
+    # Function to format everything in the Prometheus text exposition format
+    def render(self):
+        with self.lock:
+            timers = dict(self.timers)
+        lines = ['# TYPE step_seconds summary']
+        for name, timer in sorted(timers.items()):
+            for q, value in timer.percentiles().items():
+                lines.append('step_seconds{{step="{}",quantile="{}"}} {:.6f}'.format(name, q, value))
+            lines.append('step_seconds_sum{{step="{}"}} {:.6f}'.format(name, timer.total))
+            lines.append('step_seconds_count{{step="{}"}} {}'.format(name, timer.count))
+
+        # Every sample of a metric has to follow its TYPE line, so group the gauges by name
+        families = collections.OrderedDict()
+        for name, labels, value in self.gauges():
+            families.setdefault(name, []).append((labels, value))
+        for name, samples in families.items():
+            lines.append('# TYPE {} gauge'.format(name))
+            for labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(key, label) for key, label in labels.items())
+                lines.append('{}{} {}'.format(name, '{' + label_text + '}' if label_text else '', value))
+        return '\n'.join(lines) + '\n'
+
+    # Function to serve /metrics (Prometheus text) and /metrics.json on a background thread
+    def serve(self, port=9108, host='127.0.0.1'):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.render().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.stats()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Scrapes every few seconds would flood the console
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+
+# One set of metrics shared by every module in the process
+metrics = Metrics()
+
+
+# Function to format the timers as one line for the console: p50/p95/p99 in milliseconds
+def format_stats(stats):
+    return " | ".join("{} {:.1f}/{:.1f}/{:.1f} ms".format(name, values['p50'] * 1e3, values['p95'] * 1e3, values['p99'] * 1e3)
+                      for name, values in stats['timers'].items())
@@ -0,0 +1,90 @@
+from tensorflow.keras.models import Sequential, Model
+from tensorflow.keras.layers import BatchNormalization, Conv2D, MaxPooling2D, Activation, Flatten, Dropout, Dense, Input
+from tensorflow.keras import backend as K
+
+
+# Function to get the input shape and batch normalisation axis for the current image data format
+def input_shape_and_axis(width, height, depth):
+    inputShape = (height, width, depth)
+    chanDim = -1
+
+    if K.image_data_format() == "channels_first": #Returns a string, either 'channels_first' or 'channels_last'
+        inputShape = (depth, height, width)
+        chanDim = 1
+
+    return inputShape, chanDim
+
+
+# Function to build the shared convolution stack used by the gender and age models
+def build_backbone(width, height, depth):
+    inputShape, chanDim = input_shape_and_axis(width, height, depth)
+
+    backbone = Sequential(name="backbone")
+    backbone.add(Input(shape=inputShape))
+
+    backbone.add(Conv2D(32, (3,3), padding="same"))
+    backbone.add(Activation("relu"))
+    backbone.add(BatchNormalization(axis=chanDim))
+    backbone.add(MaxPooling2D(pool_size=(3,3)))
+    backbone.add(Dropout(0.25))
+
+    backbone.add(Conv2D(64, (3,3), padding="same"))
+    backbone.add(Activation("relu"))
+    backbone.add(BatchNormalization(axis=chanDim))
+
+    backbone.add(Conv2D(64, (3,3), padding="same"))
+    backbone.add(Activation("relu"))
+    backbone.add(BatchNormalization(axis=chanDim))
+    backbone.add(MaxPooling2D(pool_size=(2,2)))
+    backbone.add(Dropout(0.25))
+
+    backbone.add(Conv2D(128, (3,3), padding="same"))
+    backbone.add(Activation("relu"))
+    backbone.add(BatchNormalization(axis=chanDim))
+
+    backbone.add(Conv2D(128, (3,3), padding="same"))
+    backbone.add(Activation("relu"))
+    backbone.add(BatchNormalization(axis=chanDim))
+    backbone.add(MaxPooling2D(pool_size=(2,2)))
+    backbone.add(Dropout(0.25))
+
+    backbone.add(Flatten())
+
+    return backbone
+
+
+# Function to add the dense block that sits between the backbone and a classification head
+def dense_block(x, name):
+    x = Dense(1024, name=name + "_dense")(x)
+    x = Activation("relu")(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.5)(x)
+    return x
+
+
+# Single-output model used by the gender notebook and the age trainer
+# The output activation runs in float32, so the model can be trained with mixed precision
+def build(width, height, depth, classes, activation="sigmoid"):
+    inputShape, _ = input_shape_and_axis(width, height, depth)
+
+    inputs = Input(shape=inputShape)
+    x = build_backbone(width, height, depth)(inputs)
+    x = dense_block(x, "head")
+    x = Dense(classes)(x)
+    outputs = Activation(activation, dtype="float32")(x)
+
+    return Model(inputs, outputs)
+
+
+# Two-head model: one shared backbone, a 2-way gender sigmoid and an 8-way age softmax
+# The outputs are ordered [gender, age]
+def build_fused(width, height, depth, age_classes=8):
+    inputShape, _ = input_shape_and_axis(width, height, depth)
+
+    inputs = Input(shape=inputShape)
+    features = build_backbone(width, height, depth)(inputs)
+
+    gender = Dense(2, activation="sigmoid", name="gender")(dense_block(features, "gender"))
+    age = Dense(age_classes, activation="softmax", name="age")(dense_block(features, "age"))
+
+    return Model(inputs, [gender, age], name="age_gender")
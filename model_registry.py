@@ -0,0 +1,89 @@
+import threading
+import time
+
+import numpy as np
+
+from inference import img_dims, fused_model_path, gender_model_path, age_model_path, model_backend
+from inference import load_models, classify_batch
+
+# Batch sizes run through the models once after loading, so the first real faces don't pay for
+# graph tracing and buffer allocation
+warmup_batch_sizes = (1, 8)
+
+
+# Registry that loads the age and gender models on first use, or in the background with start()
+# Nothing here imports TensorFlow until the models are actually needed, so processes that only
+# read the predictions (the dashboards) never load it
+class ModelRegistry:
+    def __init__(self, fused_path=fused_model_path, gender_path=gender_model_path, age_path=age_model_path,
+                 backend=None, warmup_batch_sizes=warmup_batch_sizes):
+        self.fused_path = fused_path
+        self.gender_path = gender_path
+        self.age_path = age_path
+        self.backend = backend or model_backend
+        self.warmup_batch_sizes = warmup_batch_sizes
+
+        self.lock = threading.Lock()
+        self.thread = None
+        self.models = None
+        self.timings = {}
+
+    # Function to start loading the models in a background thread, e.g. while the camera opens
+    def start(self):
+        with self.lock:
+            if self.thread is None and self.models is None:
+                self.thread = threading.Thread(target=self.get, name='model-loader', daemon=True)
+                self.thread.start()
+        return self
+
+    # Function to get (gender_model, age_model), loading and warming them up on the first call
+    # Waits for a background load that is still running
+    def get(self):
+        with self.lock:
+            if self.models is None:
+                self.models = self.load()
+            return self.models
+
+    def ready(self):
+        return self.models is not None
+
+    def load(self):
+        from backends import import_runtime
+
+        start = time.perf_counter()
+        import_runtime(self.backend)
+        imported = time.perf_counter()
+        models = load_models(self.fused_path, self.gender_path, self.age_path, backend=self.backend)
+        loaded = time.perf_counter()
+        for batch_size in self.warmup_batch_sizes:
+            classify_batch(np.zeros((batch_size,) + img_dims, dtype="float32"), *models)
+        warmed = time.perf_counter()
+
+        self.timings = {
+            'import': imported - start,
+            'load': loaded - imported,
+            'warmup': warmed - loaded,
+            'total': warmed - start,
+        }
+        print(format_stats(self.stats()))
+        return models
+
+    def stats(self):
+        return dict(self.timings, backend=self.backend, ready=self.ready())
+
+
+# One registry shared by every script and thread in the process
+registry = ModelRegistry()
+
+
+# Function to get the shared (gender_model, age_model), loading them on first use
+def get_models():
+    return registry.get()
+
+
+# Function to format registry stats as one line for the console
+def format_stats(stats):
+    if 'total' not in stats:
+        return "{} models not loaded".format(stats['backend'])
+    return "{} models ready in {:.2f}s (import {:.2f}s, load {:.2f}s, warm-up {:.2f}s)".format(
+        stats['backend'], stats['total'], stats['import'], stats['load'], stats['warmup'])
@@ -0,0 +1,127 @@
+import cv2
+
+# Size frames are downscaled to before background subtraction
+gate_size = (160, 120)
+
+
+# Background-subtraction gate that tells the capture loop when a frame is worth running face detection on
+# sensitivity is the fraction of the downscaled frame that must change to open the gate; the gate stays
+# open for hold_frames after the last motion, and while faces are still in view (keep_alive)
+class MotionGate:
+    def __init__(self, sensitivity=0.002, hold_frames=10, history=500, var_threshold=16, padding=0.25):
+        self.sensitivity = sensitivity
+        self.hold_frames = hold_frames
+        self.padding = padding
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=var_threshold,
+                                                             detectShadows=False)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.since_motion = None
+
+        # Changed regions of the last frame in full-resolution (startX, startY, endX, endY), None for
+        # the whole frame
+        self.regions = None
+
+        self.frames_processed = 0
+        self.frames_skipped = 0
+
+    # Function to check a frame, returns True when face detection should run on it
+    def __call__(self, frame, keep_alive=False):
+        small = cv2.resize(frame, gate_size, interpolation=cv2.INTER_AREA)
+        mask = self.subtractor.apply(small)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+
+        changed = cv2.countNonZero(mask) / float(gate_size[0] * gate_size[1])
+        if changed >= self.sensitivity:
+            self.since_motion = 0
+            self.regions = self.changed_regions(mask, frame.shape)
+        else:
+            self.since_motion = None if self.since_motion is None else self.since_motion + 1
+            self.regions = None
+
+        active = keep_alive or (self.since_motion is not None and self.since_motion <= self.hold_frames)
+        if active:
+            self.frames_processed += 1
+        else:
+            self.frames_skipped += 1
+        return active
+
+    # Function to get the padded bounding boxes of the changed areas, scaled to the full frame
+    def changed_regions(self, mask, frame_shape):
+        scale_x = frame_shape[1] / float(gate_size[0])
+        scale_y = frame_shape[0] / float(gate_size[1])
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            pad_x = int(w * self.padding) + 1
+            pad_y = int(h * self.padding) + 1
+            regions.append([max(int((x - pad_x) * scale_x), 0), max(int((y - pad_y) * scale_y), 0),
+                            min(int((x + w + pad_x) * scale_x), frame_shape[1]),
+                            min(int((y + h + pad_y) * scale_y), frame_shape[0])])
+        return merge_regions(regions)
+
+    def stats(self):
+        total = self.frames_processed + self.frames_skipped
+        return {
+            'processed': self.frames_processed,
+            'skipped': self.frames_skipped,
+            'skipped_ratio': self.frames_skipped / float(total) if total else 0.0,
+        }
+
+
+# Function to merge overlapping regions until none overlap
+def merge_regions(regions):
+    regions = [list(region) for region in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+# Function to add the faces known from earlier frames (tracked or carried boxes) to the changed regions
+# A face that holds still leaves no motion, so without its box it would be lost whenever something else
+# moves; boxes are padded by padding of their size to still cover a face that moved a little.
+# regions None (the whole frame) stays None
+def add_face_regions(regions, boxes, frame_shape, padding=0.5):
+    if regions is None or not boxes:
+        return regions
+    height, width = frame_shape[:2]
+    regions = list(regions)
+    for x1, y1, x2, y2 in boxes:
+        pad_x = int((x2 - x1) * padding) + 1
+        pad_y = int((y2 - y1) * padding) + 1
+        region = [max(int(x1) - pad_x, 0), max(int(y1) - pad_y, 0), min(int(x2) + pad_x, width), min(int(y2) + pad_y, height)]
+        if region[2] > region[0] and region[3] > region[1]:
+            regions.append(region)
+    return merge_regions(regions)
+
+
+# Function to run a face detector only on the changed regions of a frame
+# Falls back to the whole frame when regions is None or covers more than max_coverage of it
+def detect_in_regions(frame, regions, detect, max_coverage=0.5):
+    height, width = frame.shape[:2]
+    if regions is None or sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions) > max_coverage * width * height:
+        return detect(frame)
+
+    face = []
+    for x1, y1, x2, y2 in regions:
+        for f in detect(frame[y1:y2, x1:x2]):
+            face.append([f[0] + x1, f[1] + y1, f[2] + x1, f[3] + y1])
+    return face
+
+
+# Function to format gate stats as one line for the console
+def format_stats(stats):
+    return "motion gate processed {} frames, skipped {} ({:.0%})".format(
+        stats['processed'], stats['skipped'], stats['skipped_ratio'])
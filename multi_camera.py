@@ -0,0 +1,185 @@
+from inference import predict_frames
+from model_registry import get_models
+from pipeline import StageQueue, DROP_OLDEST
+from prediction_sink import PredictionWriter
+from detectors import load_detector, detectors
+import cv2
+import argparse
+import datetime
+import queue
+import threading
+import time
+
+# Frame size every camera is resized to, as in the capture scripts
+frame_size = (640, 480)
+
+
+# Function to open a source given as a device index ("0"), a video file or an RTSP URL
+def open_source(source):
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+# Reader thread for one camera, pushes (camera_id, frame_idx, timestamp, frame) into the shared queue
+class CameraReader(threading.Thread):
+    def __init__(self, camera_id, source, out_queue):
+        super().__init__(name='camera-{}'.format(camera_id), daemon=True)
+        self.camera_id = camera_id
+        self.source = source
+        self.out_queue = out_queue
+        self.stopped = threading.Event()
+        self.frames = 0
+
+    def run(self):
+        capture = open_source(self.source)
+        while not self.stopped.is_set() and capture.isOpened():
+            status, frame = capture.read()
+            if not status:
+                break
+            frame = cv2.resize(frame, frame_size)
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.out_queue.put((self.camera_id, self.frames, timestamp, frame))
+            self.frames += 1
+        capture.release()
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Runner that reads any number of cameras and classifies their faces on a shared pool of workers
+# Models are loaded once and shared by all workers, so memory does not grow with the camera count
+# on_prediction is called with (camera_id, frame_idx, timestamp, box, prediction) for every face
+# Every worker gets its own face detector (detector backend, detect_width, see detectors.py); the default
+# ssd backend is cvlib's model with one cv2.dnn network per worker, so detection runs in parallel
+# (the cvlib backend shares one network and would serialize the workers on it)
+# The frame queue holds one micro-batch per worker: enough to keep every worker busy, and when the
+# workers fall behind the oldest frames are dropped instead of piling up latency with every camera added
+class MultiCameraRunner:
+    def __init__(self, sources, on_prediction, workers=2, max_batch=8,
+                 gender_model=None, age_model=None, detector='ssd', detect_width=None):
+        if gender_model is None:
+            gender_model, age_model = get_models()
+        self.gender_model = gender_model
+        self.age_model = age_model
+        self.detector = detector
+        self.detect_width = detect_width
+        self.on_prediction = on_prediction
+        self.max_batch = max_batch
+
+        self.frames = StageQueue(maxsize=workers * max_batch, drop_policy=DROP_OLDEST)
+        self.readers = [CameraReader(camera_id, source, self.frames) for camera_id, source in enumerate(sources)]
+        self.workers = [threading.Thread(target=self.work, name='worker-{}'.format(i), daemon=True)
+                        for i in range(workers)]
+        self.emit_lock = threading.Lock()
+        self.processed = [0] * len(sources)
+        self.predictions = [0] * len(sources)
+        self.batches = 0
+        self.started_at = None
+
+    def readers_alive(self):
+        return any(reader.is_alive() for reader in self.readers)
+
+    # Function to collect up to max_batch frames from any camera, waiting only for the first one
+    def gather(self):
+        try:
+            items = [self.frames.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(items) < self.max_batch:
+            try:
+                items.append(self.frames.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def work(self):
+        detector = load_detector(self.detector, self.detect_width)
+        while True:
+            items = self.gather()
+            if not items:
+                if not self.readers_alive() and self.frames.depth() == 0:
+                    return
+                continue
+
+            # Apply face detection on every frame of the micro-batch
+            detections = []
+            for camera_id, frame_idx, timestamp, frame in items:
+                face, confidence = detector(frame)
+                detections.append((frame, face))
+
+            # Classify the faces of all frames together, across cameras
+            predictions = predict_frames(detections, self.gender_model, self.age_model)
+
+            with self.emit_lock:
+                self.batches += 1
+                for (camera_id, frame_idx, timestamp, frame), (_, face), frame_predictions in zip(items, detections, predictions):
+                    self.processed[camera_id] += 1
+                    for f, prediction in zip(face, frame_predictions):
+                        if prediction is None:
+                            continue
+                        self.predictions[camera_id] += 1
+                        self.on_prediction(camera_id, frame_idx, timestamp, f, prediction)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        # Readers first, workers exit once no reader is alive and the queue is empty
+        for reader in self.readers:
+            reader.start()
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for reader in self.readers:
+            reader.stop()
+
+    def join(self):
+        for reader in self.readers:
+            reader.join()
+        for worker in self.workers:
+            worker.join()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        cameras = {}
+        for reader in self.readers:
+            camera_id = reader.camera_id
+            cameras[camera_id] = {
+                'source': reader.source,
+                'read': reader.frames,
+                'processed': self.processed[camera_id],
+                'predictions': self.predictions[camera_id],
+                'fps': self.processed[camera_id] / elapsed if elapsed > 0 else 0.0,
+            }
+        return {'cameras': cameras, 'batches': self.batches, 'dropped': self.frames.dropped}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run age and gender detection on several cameras with a shared worker pool')
+    parser.add_argument('sources', nargs='+', help='device indices, video files or RTSP URLs')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=8, help='maximum frames per micro-batch')
+    parser.add_argument('--output', default='predictions_multi.csv')
+    parser.add_argument('--detector', default='ssd', choices=sorted(detectors), help='face detector backend, one per worker')
+    parser.add_argument('--detect-width', type=int, default=None, help='detect faces on frames downscaled to this width')
+    args = parser.parse_args()
+
+    writer = PredictionWriter(args.output, header=['Timestamp', 'Camera', 'Predicted_Age', 'Predicted_Gender'])
+
+    # Record which camera every prediction came from
+    def write_prediction(camera_id, frame_idx, timestamp, box, prediction):
+        age_label, age_conf, gender_label, gender_conf = prediction
+        writer.write([timestamp, camera_id, age_label, gender_label])
+
+    runner = MultiCameraRunner(args.sources, write_prediction, workers=args.workers, max_batch=args.batch,
+                               detector=args.detector, detect_width=args.detect_width)
+    runner.start()
+    try:
+        while runner.readers_alive():
+            time.sleep(5)
+            print(runner.stats())
+    except KeyboardInterrupt:
+        runner.stop()
+    runner.join()
+    writer.close()
+    print(runner.stats())
@@ -0,0 +1,213 @@
+import queue
+import threading
+import time
+import traceback
+
+from metrics import metrics
+
+# Drop policies for a full queue between stages
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+
+# Marker passed down the pipeline when the source is exhausted or the pipeline is stopped
+END = object()
+
+
+# Bounded queue between two stages that either blocks the producer or drops the oldest item when full
+class StageQueue:
+    def __init__(self, maxsize=4, drop_policy=DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError("Unknown drop policy: {}".format(drop_policy))
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def put(self, item):
+        if self.drop_policy == BLOCK:
+            self.queue.put(item)
+            return
+
+        # The end marker is always the last item put, so it is never the one dropped
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def depth(self):
+        return self.queue.qsize()
+
+
+# One pipeline stage running fn on its own thread
+# fn takes an item and returns the item for the next stage, or None to discard it
+# Every call is timed into the stage's timer in metrics, for its latency percentiles
+# An item fn raises on is dropped and counted as failed, the stage carries on with the next one;
+# the end marker is always passed on, so Pipeline.drain() can't wait forever on a dead stage
+class Stage(threading.Thread):
+    def __init__(self, name, fn, in_queue, out_queue=None):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.started_at = None
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        item = None
+        try:
+            while True:
+                item = self.in_queue.get()
+                if item is END:
+                    break
+                start = time.perf_counter()
+                try:
+                    result = self.fn(item)
+                except Exception:
+                    result = None
+                    self.failed += 1
+                    # Only the first traceback is printed, a failing stage would flood the console
+                    if self.failed == 1:
+                        print("Stage {} failed, dropping the item (later failures are only counted):".format(self.name))
+                        traceback.print_exc()
+                self.busy_time += metrics.observe(self.name, start)
+                self.processed += 1
+                if result is not None and self.out_queue is not None:
+                    self.out_queue.put(result)
+        finally:
+            if self.out_queue is not None:
+                self.out_queue.put(END)
+            # Left the loop early: keep taking input, so a blocked producer can still finish
+            while item is not END:
+                item = self.in_queue.get()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        stats = {
+            'processed': self.processed,
+            'failed': self.failed,
+            'fps': self.processed / elapsed if elapsed > 0 else 0.0,
+            'busy': self.busy_time / elapsed if elapsed > 0 else 0.0,
+            'dropped_in': self.in_queue.dropped,
+            'queue_depth': self.in_queue.depth(),
+        }
+        for q, value in metrics.get_timer(self.name).percentiles().items():
+            stats['p{}'.format(int(q * 100))] = value
+        return stats
+
+
+# Capture thread reading frames from a cv2.VideoCapture-like source into the first queue
+class CaptureStage(threading.Thread):
+    def __init__(self, source, out_queue):
+        super().__init__(name='capture', daemon=True)
+        self.source = source
+        self.out_queue = out_queue
+        self.stopped = threading.Event()
+        self.processed = 0
+        self.started_at = None
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        try:
+            while not self.stopped.is_set() and self.source.isOpened():
+                start = time.perf_counter()
+                status, frame = self.source.read()
+                metrics.observe('read', start)
+                if not status:
+                    break
+                self.processed += 1
+                self.out_queue.put(frame)
+        finally:
+            self.out_queue.put(END)
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'processed': self.processed,
+            'fps': self.processed / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+# Staged capture -> stage 1 -> ... -> stage n pipeline with bounded queues in between
+# stages is a list of (name, fn) pairs; items coming out of the last stage land in self.output
+class Pipeline:
+    def __init__(self, source, stages, queue_size=4, drop_policy=DROP_OLDEST):
+        first_queue = StageQueue(queue_size, drop_policy)
+        self.capture = CaptureStage(source, first_queue)
+        self.stages = []
+
+        in_queue = first_queue
+        for name, fn in stages:
+            out_queue = StageQueue(queue_size, drop_policy)
+            self.stages.append(Stage(name, fn, in_queue, out_queue))
+            in_queue = out_queue
+
+        # Output is always drop oldest, a slow consumer (e.g. the display) must not stall the pipeline
+        self.output = in_queue
+        self.output.drop_policy = DROP_OLDEST
+        self.finished = False
+
+    def start(self):
+        for stage in reversed(self.stages):
+            stage.start()
+        self.capture.start()
+
+    def stop(self):
+        self.capture.stop()
+
+    # Function to get the next output item, or END once the pipeline has drained
+    def get(self, timeout=None):
+        item = self.output.get(timeout=timeout)
+        if item is END:
+            self.finished = True
+        return item
+
+    # Function to stop capturing and let every stage finish the items already queued
+    def drain(self):
+        self.stop()
+        while not self.finished:
+            self.get()
+        self.join()
+
+    def join(self, timeout=None):
+        self.capture.join(timeout)
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self):
+        stats = {'capture': self.capture.stats()}
+        for stage in self.stages:
+            stats[stage.name] = stage.stats()
+        stats['output'] = {'dropped_in': self.output.dropped, 'queue_depth': self.output.depth()}
+        return stats
+
+
+# Function to format pipeline stats as one line for the console
+def format_stats(stats):
+    parts = []
+    for name, values in stats.items():
+        if 'fps' in values:
+            parts.append("{} {:.1f} fps".format(name, values['fps']))
+        if 'p95' in values:
+            parts.append("{} p95 {:.1f} ms".format(name, values['p95'] * 1e3))
+        if values.get('dropped_in'):
+            parts.append("{} dropped {}".format(name, values['dropped_in']))
+        if values.get('failed'):
+            parts.append("{} failed {}".format(name, values['failed']))
+    return " | ".join(parts)
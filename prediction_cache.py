@@ -0,0 +1,117 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Function to get the 64 bit difference hash of a face crop: the sign of the horizontal gradients of a
+# 9x8 grayscale thumbnail. Nearly identical crops differ in a few bits, whatever their brightness
+def dhash(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+# One cached prediction
+class CacheEntry:
+    __slots__ = ('crop_hash', 'center', 'prediction', 'expires')
+
+    def __init__(self, crop_hash, center, prediction, expires):
+        self.crop_hash = crop_hash
+        self.center = center
+        self.prediction = prediction
+        self.expires = expires
+
+
+# Bounded LRU cache of predictions for near-duplicate face crops, e.g. a person standing still
+# A crop hits an entry when their hashes differ in at most max_distance bits and the box centres are
+# at most max_shift pixels apart; entries expire ttl seconds after they were classified, so a person
+# is still classified again now and then. Only the max_size most recently used entries are kept.
+class PredictionCache:
+    def __init__(self, max_size=256, ttl=2.0, max_distance=6, max_shift=24):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_shift = max_shift
+        self.entries = collections.OrderedDict()
+        self.next_key = 0
+        self.lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.expired = 0
+        self.evicted = 0
+        # Average model time per face, measured on misses, to count the time hits save
+        self.face_time = None
+        self.saved_time = 0.0
+
+    # Function to get the cached prediction for a 96x96 crop of the face at box, None on a miss
+    # Returns (crop_hash, prediction), the hash to pass to put() after classifying a miss
+    def get(self, crop, box):
+        crop_hash = dhash(crop)
+        center = ((box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0)
+        now = time.monotonic()
+        with self.lock:
+            self.lookups += 1
+            for key in reversed(self.entries):
+                entry = self.entries[key]
+                if entry.expires <= now:
+                    continue
+                if (entry.crop_hash ^ crop_hash).bit_count() > self.max_distance:
+                    continue
+                if abs(entry.center[0] - center[0]) > self.max_shift or abs(entry.center[1] - center[1]) > self.max_shift:
+                    continue
+                # Follow the person as they drift, and keep the entry as most recently used
+                entry.center = center
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if self.face_time is not None:
+                    self.saved_time += self.face_time
+                return crop_hash, entry.prediction
+        return crop_hash, None
+
+    # Function to add the prediction of a crop that missed
+    def put(self, crop_hash, box, prediction):
+        center = ((box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0)
+        now = time.monotonic()
+        with self.lock:
+            self.entries[self.next_key] = CacheEntry(crop_hash, center, prediction, now + self.ttl)
+            self.next_key += 1
+            while self.entries:
+                key, entry = next(iter(self.entries.items()))
+                if entry.expires <= now:
+                    self.expired += 1
+                elif len(self.entries) > self.max_size:
+                    self.evicted += 1
+                else:
+                    break
+                del self.entries[key]
+
+    # Function to record how long the models took for a batch of misses
+    def add_model_time(self, seconds, faces):
+        if faces == 0:
+            return
+        per_face = seconds / faces
+        with self.lock:
+            self.face_time = per_face if self.face_time is None else 0.9 * self.face_time + 0.1 * per_face
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / float(self.lookups) if self.lookups else 0.0,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'saved_time': self.saved_time,
+            }
+
+
+# Function to format cache stats as one line for the console
+def format_stats(stats):
+    return "prediction cache {} hits of {} faces ({:.0%}), {:.1f}s of inference saved".format(
+        stats['hits'], stats['lookups'], stats['hit_rate'], stats['saved_time'])
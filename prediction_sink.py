@@ -0,0 +1,151 @@
+import atexit
+import collections
+import csv
+import datetime
+import os
+import threading
+import time
+
+
+# Background CSV writer for predictions
+# Rows are appended to an in-memory ring buffer and written by a worker thread once flush_rows
+# rows are waiting or flush_interval seconds have passed, the file stays open between flushes
+# and is fsynced every fsync_interval seconds. filename may contain strftime codes (e.g.
+# 'predictions_%Y%m%d.csv') to rotate files by date, resolved when a row is queued so rows queued
+# just before midnight still go to that day's file; the header is written to new files only
+class PredictionWriter(threading.Thread):
+    def __init__(self, filename='predictions.csv', header=('Predicted_Age', 'Predicted_Gender'),
+                 flush_rows=256, flush_interval=1.0, fsync_interval=10.0, buffer_size=100000):
+        super().__init__(name='prediction-writer', daemon=True)
+        self.filename = filename
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        # Oldest rows are dropped (and counted) only if the disk can't keep up for buffer_size rows
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.flush_requests = 0
+        self.flushes_done = 0
+        self.closed = False
+
+        self.file = None
+        self.file_path = None
+        self.csv_writer = None
+        # strftime result of the current second, write() is called for every row
+        self.path_second = None
+        self.path = filename
+        self.last_fsync = time.monotonic()
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+
+        atexit.register(self.close)
+        self.start()
+
+    # Function to queue one row, cheap enough to call from the capture loop
+    def write(self, row):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.rows_dropped += 1
+        self.buffer.append((self.current_path(), row))
+        if len(self.buffer) == self.flush_rows:
+            with self.condition:
+                self.condition.notify()
+
+    # Function to block until every row queued so far is on disk
+    def flush(self):
+        with self.condition:
+            self.flush_requests += 1
+            request = self.flush_requests
+            self.condition.notify_all()
+            while self.flushes_done < request and self.is_alive():
+                self.condition.wait(0.1)
+
+    # Function to flush the remaining rows, fsync and stop the writer thread
+    def close(self):
+        if self.closed:
+            return
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.closed and self.flushes_done == self.flush_requests and len(self.buffer) < self.flush_rows:
+                    self.condition.wait(self.flush_interval)
+                closing = self.closed
+                request = self.flush_requests
+
+            self.write_buffer(fsync=closing)
+
+            with self.condition:
+                self.flushes_done = request
+                self.condition.notify_all()
+
+            if closing:
+                if self.file is not None:
+                    self.file.close()
+                return
+
+    # Function to get the file a row queued now belongs to
+    def current_path(self):
+        if '%' not in self.filename:
+            return self.filename
+        second = int(time.time())
+        if second != self.path_second:
+            self.path = datetime.datetime.fromtimestamp(second).strftime(self.filename)
+            self.path_second = second
+        return self.path
+
+    # Function to open (or switch to) the file at path
+    def open_file(self, path):
+        if path == self.file_path:
+            return
+
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+        new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.file_path = path
+        self.csv_writer = csv.writer(self.file)
+        if new_file and self.header:
+            self.csv_writer.writerow(self.header)
+
+    def write_buffer(self, fsync=False):
+        rows = []
+        while self.buffer:
+            rows.append(self.buffer.popleft())
+
+        if rows:
+            # Consecutive rows of the same file are written together
+            start = 0
+            for end in range(1, len(rows) + 1):
+                if end == len(rows) or rows[end][0] != rows[start][0]:
+                    self.open_file(rows[start][0])
+                    self.csv_writer.writerows(row for path, row in rows[start:end])
+                    start = end
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+        if self.file is None:
+            return
+
+        self.file.flush()
+        if fsync or time.monotonic() - self.last_fsync >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.last_fsync = time.monotonic()
+
+    def stats(self):
+        return {
+            'rows_written': self.rows_written,
+            'rows_pending': len(self.buffer),
+            'rows_dropped': self.rows_dropped,
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,313 @@
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import datetime
+import os
+import shutil
+import uuid
+
+# Columns stored for every prediction, categorical columns are dictionary encoded
+schema = pa.schema([
+    ('timestamp', pa.timestamp('s')),
+    ('camera', pa.dictionary(pa.int8(), pa.string())),
+    ('age', pa.dictionary(pa.int8(), pa.string())),
+    ('gender', pa.dictionary(pa.int8(), pa.string())),
+    ('age_conf', pa.float32()),
+    ('gender_conf', pa.float32()),
+    ('x1', pa.int16()),
+    ('y1', pa.int16()),
+    ('x2', pa.int16()),
+    ('y2', pa.int16()),
+])
+
+# Directory layout: <root>/date=YYYY-MM-DD/camera=<id>/part-*.parquet
+partitioning = ds.partitioning(pa.schema([('date', pa.string()), ('camera', pa.string())]), flavor='hive')
+
+# Columns of the rollup tables: number of predictions per time bucket, camera, age and gender
+rollup_schema = pa.schema([
+    ('bucket', pa.timestamp('s')),
+    ('camera', pa.dictionary(pa.int8(), pa.string())),
+    ('age', pa.dictionary(pa.int8(), pa.string())),
+    ('gender', pa.dictionary(pa.int8(), pa.string())),
+    ('count', pa.int32()),
+])
+
+# Rollup granularities and the pandas frequency their buckets are floored to
+rollup_granularities = {
+    'minute': 'min',
+    'hour': 'h',
+    'day': 'D',
+}
+
+# Rollup layout: <rollup root>/<granularity>/date=YYYY-MM-DD/rollup.parquet, one file per date, rebuilt
+# whenever the raw rows of the date change
+rollup_partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+rollup_file = 'rollup.parquet'
+
+# Mapping from the CSV column names to the store column names
+csv_columns = {
+    'Timestamp': 'timestamp',
+    'Camera': 'camera',
+    'Predicted_Age': 'age',
+    'Predicted_Gender': 'gender',
+}
+
+
+# Append-only prediction store, partitioned by date and camera, one parquet file per append
+# Raw rows can be summarised into per-minute, per-hour and per-day age x gender counts (rollup), which
+# are kept next to the store in rollup_root and outlive the raw rows (expire)
+class PredictionStore:
+    def __init__(self, root='prediction_store', rollup_root=None):
+        self.root = root
+        self.rollup_root = rollup_root or root.rstrip('/\\') + '_rollups'
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(self.rollup_root, exist_ok=True)
+
+    # Function to append a DataFrame of predictions with (a subset of) the schema columns
+    def append(self, frame):
+        if len(frame) == 0:
+            return
+
+        frame = frame.copy()
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        if 'camera' not in frame:
+            frame['camera'] = '0'
+        frame['camera'] = frame['camera'].astype(str)
+        for name in schema.names:
+            if name not in frame:
+                frame[name] = None
+
+        dates = frame['timestamp'].dt.strftime('%Y-%m-%d')
+        for (date, camera), part in frame.groupby([dates, frame['camera']], sort=False):
+            folder = os.path.join(self.root, 'date={}'.format(date), 'camera={}'.format(camera))
+            os.makedirs(folder, exist_ok=True)
+            table = pa.Table.from_pandas(part[schema.names], schema=schema, preserve_index=False)
+            # The partition columns live in the path, not in the file
+            table = table.drop(['camera'])
+            pq.write_table(table, os.path.join(folder, 'part-{}.parquet'.format(uuid.uuid4().hex)))
+
+    # Function to append rows given as (timestamp, camera, age, gender, age_conf, gender_conf, box)
+    def append_rows(self, rows):
+        records = []
+        for timestamp, camera, age, gender, age_conf, gender_conf, box in rows:
+            x1, y1, x2, y2 = box if box is not None else (None, None, None, None)
+            records.append((timestamp, camera, age, gender, age_conf, gender_conf, x1, y1, x2, y2))
+        self.append(pd.DataFrame.from_records(records, columns=schema.names))
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=partitioning)
+
+    # Function to load the predictions between start and end (inclusive, datetimes or strings)
+    # Only the date partitions in the range, the requested cameras and the requested columns are read
+    def query(self, start=None, end=None, columns=None, cameras=None):
+        dataset = self.dataset()
+        condition = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if start is not None:
+            start = pd.Timestamp(start)
+            condition = both(condition, ds.field('date') >= start.strftime('%Y-%m-%d'))
+            condition = both(condition, ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), pa.timestamp('s')))
+        if end is not None:
+            end = pd.Timestamp(end)
+            condition = both(condition, ds.field('date') <= end.strftime('%Y-%m-%d'))
+            condition = both(condition, ds.field('timestamp') <= pa.scalar(end.to_pydatetime(), pa.timestamp('s')))
+        if cameras is not None:
+            condition = both(condition, ds.field('camera').isin([str(camera) for camera in cameras]))
+
+        if columns is not None:
+            columns = list(columns)
+
+        return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+    # Function to list the dates that have data
+    def dates(self):
+        return sorted(name[len('date='):] for name in os.listdir(self.root) if name.startswith('date='))
+
+    # Function to merge the part files of one date into a single file per camera
+    def compact(self, date):
+        date_folder = os.path.join(self.root, 'date={}'.format(date))
+        for camera_folder in os.listdir(date_folder):
+            folder = os.path.join(date_folder, camera_folder)
+            parts = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.parquet')]
+            if len(parts) < 2:
+                continue
+            table = pa.concat_tables([pq.read_table(part) for part in parts]).sort_by('timestamp')
+            pq.write_table(table, os.path.join(folder, 'part-{}.parquet'.format(uuid.uuid4().hex)))
+            for part in parts:
+                os.remove(part)
+
+    # Function to get the time the raw rows of a date last changed, None when the date has no rows
+    def date_modified(self, date):
+        date_folder = os.path.join(self.root, 'date={}'.format(date))
+        times = [os.path.getmtime(os.path.join(root, name))
+                 for root, dirs, files in os.walk(date_folder) for name in files if name.endswith('.parquet')]
+        return max(times) if times else None
+
+    def rollup_path(self, granularity, date):
+        return os.path.join(self.rollup_root, granularity, 'date={}'.format(date), rollup_file)
+
+    # Function to build the rollups of the given dates (all dates by default), returns the dates rebuilt
+    # A date is only read again when raw rows were appended after its rollups were built
+    def rollup(self, dates=None, force=False):
+        rebuilt = []
+        for date in dates if dates is not None else self.dates():
+            modified = self.date_modified(date)
+            if modified is None:
+                continue
+            paths = [self.rollup_path(granularity, date) for granularity in rollup_granularities]
+            if not force and all(os.path.isfile(path) and os.path.getmtime(path) >= modified for path in paths):
+                continue
+
+            frame = self.dataset().to_table(columns=['timestamp', 'camera', 'age', 'gender'],
+                                            filter=ds.field('date') == date).to_pandas()
+            for column in ['camera', 'age', 'gender']:
+                frame[column] = frame[column].astype(str)
+            for granularity, frequency in rollup_granularities.items():
+                buckets = frame['timestamp'].dt.floor(frequency).rename('bucket')
+                counts = frame.groupby([buckets, frame['camera'], frame['age'], frame['gender']], observed=True).size()
+                table = pa.Table.from_pandas(counts.rename('count').reset_index(), schema=rollup_schema,
+                                             preserve_index=False)
+
+                # Written next to the old rollup and swapped in, so readers never see half a file
+                path = self.rollup_path(granularity, date)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                pq.write_table(table, path + '.tmp')
+                os.replace(path + '.tmp', path)
+            rebuilt.append(date)
+        return rebuilt
+
+    # Function to delete the raw rows older than raw_days days, after rolling them up
+    # minute_days optionally expires the per-minute rollups too; hourly and daily rollups are kept
+    def expire(self, raw_days, minute_days=None, today=None):
+        # Per-minute rollups of dates that still have raw rows would just be rebuilt
+        if minute_days is not None and minute_days < raw_days:
+            raise ValueError("Per-minute rollups can't expire before the raw rows ({} < {} days)".format(minute_days, raw_days))
+        today = pd.Timestamp(today or datetime.date.today()).normalize()
+        raw_cutoff = (today - pd.Timedelta(days=raw_days)).strftime('%Y-%m-%d')
+        expired = [date for date in self.dates() if date < raw_cutoff]
+        self.rollup(expired)
+        for date in expired:
+            shutil.rmtree(os.path.join(self.root, 'date={}'.format(date)))
+
+        if minute_days is not None:
+            minute_cutoff = (today - pd.Timedelta(days=minute_days)).strftime('%Y-%m-%d')
+            for date in self.rollup_dates('minute'):
+                if date < minute_cutoff:
+                    shutil.rmtree(os.path.dirname(self.rollup_path('minute', date)))
+        return expired
+
+    # Function to list the dates that have rollups of a granularity
+    def rollup_dates(self, granularity):
+        folder = os.path.join(self.rollup_root, granularity)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name[len('date='):] for name in os.listdir(folder) if name.startswith('date='))
+
+    # Function to load the counts of a granularity between start and end (inclusive)
+    # Returns one row per (bucket, camera, age, gender) with its count; by lists the columns to keep,
+    # counts are summed over the others (e.g. by=['bucket', 'gender'] for the gender split over time)
+    def query_rollup(self, granularity, start=None, end=None, cameras=None, by=None):
+        if granularity not in rollup_granularities:
+            raise ValueError("Unknown rollup granularity: {}".format(granularity))
+        columns = ['bucket', 'camera', 'age', 'gender', 'count']
+        folder = os.path.join(self.rollup_root, granularity)
+        if not self.rollup_dates(granularity):
+            return pd.DataFrame(columns=by + ['count'] if by else columns)
+
+        condition = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if start is not None:
+            start = pd.Timestamp(start)
+            condition = both(condition, ds.field('date') >= start.strftime('%Y-%m-%d'))
+            condition = both(condition, ds.field('bucket') >= pa.scalar(start.floor(rollup_granularities[granularity]).to_pydatetime(), pa.timestamp('s')))
+        if end is not None:
+            end = pd.Timestamp(end)
+            condition = both(condition, ds.field('date') <= end.strftime('%Y-%m-%d'))
+            condition = both(condition, ds.field('bucket') <= pa.scalar(end.to_pydatetime(), pa.timestamp('s')))
+        if cameras is not None:
+            condition = both(condition, ds.field('camera').isin([str(camera) for camera in cameras]))
+
+        dataset = ds.dataset(folder, format='parquet', partitioning=rollup_partitioning)
+        frame = dataset.to_table(columns=columns, filter=condition).to_pandas()
+        if by is None:
+            return frame
+        for column in by:
+            if column != 'bucket':
+                frame[column] = frame[column].astype(str)
+        return frame.groupby(list(by), sort=True)['count'].sum().reset_index()
+
+    # Function to get the counts between start and end as an aggregate snapshot (see aggregates.py),
+    # so the dashboard figures can be drawn from the rollups; time is keyed by bucket at granularity
+    def rollup_snapshot(self, granularity, start=None, end=None, cameras=None):
+        frame = self.query_rollup(granularity, start, end, cameras, by=['bucket', 'age', 'gender'])
+        time_format = {'minute': '%Y-%m-%d %H:%M', 'hour': '%Y-%m-%d %H', 'day': '%Y-%m-%d'}[granularity]
+        return {
+            'columns': [],
+            'total': int(frame['count'].sum()),
+            'gender': {key: int(value) for key, value in frame.groupby('gender')['count'].sum().items()},
+            'age': {key: int(value) for key, value in frame.groupby('age')['count'].sum().items()},
+            'age_gender': {key: int(value) for key, value in frame.groupby(['age', 'gender'])['count'].sum().items()},
+            'time': {key.strftime(time_format): int(value) for key, value in frame.groupby('bucket')['count'].sum().items()},
+            'first': [],
+            'recent': [],
+        }
+
+
+# Function to read one prediction CSV into store columns
+# Files without a Timestamp column (predictions.csv) get the date from their name or mtime
+def read_prediction_csv(path):
+    frame = pd.read_csv(path).rename(columns=csv_columns)
+    if 'timestamp' not in frame:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            fallback = datetime.datetime.strptime(name.split('_')[-1], '%Y%m%d')
+        except ValueError:
+            fallback = datetime.datetime.fromtimestamp(os.path.getmtime(path)).replace(microsecond=0)
+        frame['timestamp'] = fallback
+    return frame
+
+
+# Function to migrate existing prediction CSVs into the store, returns the number of rows
+def migrate_csvs(paths, store):
+    rows = 0
+    for path in paths:
+        frame = read_prediction_csv(path)
+        store.append(frame)
+        rows += len(frame)
+        print("Migrated {} rows from {}".format(len(frame), path))
+    return rows
+
+
+if __name__ == '__main__':
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description='Migrate prediction CSVs into the partitioned parquet store')
+    parser.add_argument('csvs', nargs='*', help='defaults to predictions.csv and predictions_*.csv')
+    parser.add_argument('--store', default='prediction_store')
+    parser.add_argument('--rollup', action='store_true', help='only build the rollups of changed dates')
+    parser.add_argument('--retain-days', type=int, default=None, help='delete raw rows older than this, after rolling them up')
+    parser.add_argument('--retain-minute-days', type=int, default=None, help='delete per-minute rollups older than this')
+    args = parser.parse_args()
+
+    store = PredictionStore(args.store)
+    if args.rollup or args.retain_days is not None:
+        print("Rolled up {} dates".format(len(store.rollup())))
+        if args.retain_days is not None:
+            expired = store.expire(args.retain_days, args.retain_minute_days)
+            print("Expired raw rows of {} dates".format(len(expired)))
+        raise SystemExit
+
+    paths = args.csvs or sorted(p for p in ['predictions.csv'] + glob.glob('predictions_*.csv') if os.path.isfile(p))
+    total = migrate_csvs(paths, store)
+    for date in store.dates():
+        store.compact(date)
+    store.rollup()
+    print("Migrated {} rows from {} files into {}".format(total, len(paths), args.store))
@@ -0,0 +1,130 @@
+// Applies the prediction events pushed by live_updates.py to a Dash dashboard.
+// Figures are patched with Plotly.restyle when only their data changed, and replaced with
+// Plotly.react when traces were added or the layout changed.
+(function () {
+    var lastSeq = 0;
+
+    function graphDiv(id) {
+        var container = document.getElementById(id);
+        return container && container.querySelector('.js-plotly-plot');
+    }
+
+    function applyFigures(figures) {
+        Object.keys(figures).forEach(function (id) {
+            var gd = graphDiv(id);
+            var update = figures[id];
+            if (!gd) {
+                return;
+            }
+            if (update.figure) {
+                Plotly.react(gd, update.figure.data, update.figure.layout);
+            } else if (gd.data && gd.data.length === update.traces && Object.keys(update.patch).length) {
+                var traces = [];
+                for (var i = 0; i < update.traces; i++) {
+                    traces.push(i);
+                }
+                Plotly.restyle(gd, update.patch, traces);
+            }
+        });
+    }
+
+    function applyTexts(texts) {
+        Object.keys(texts).forEach(function (id) {
+            var element = document.getElementById(id);
+            if (element) {
+                element.textContent = texts[id];
+            }
+        });
+    }
+
+    function applyLists(lists) {
+        Object.keys(lists).forEach(function (id) {
+            var element = document.getElementById(id);
+            if (!element) {
+                return;
+            }
+            element.innerHTML = '';
+            lists[id].forEach(function (line) {
+                var item = document.createElement('li');
+                item.textContent = line;
+                element.appendChild(item);
+            });
+        });
+    }
+
+    function row(cells, tag) {
+        var tr = document.createElement('tr');
+        cells.forEach(function (value) {
+            var cell = document.createElement(tag);
+            cell.textContent = value;
+            tr.appendChild(cell);
+        });
+        return tr;
+    }
+
+    // Appends the new rows to the recent rows table and keeps only the last `limit` of them
+    function applyTable(table) {
+        var element = document.getElementById(table.id);
+        if (!element) {
+            return;
+        }
+        var body = element.querySelector('tbody');
+        if (table.reset || !body) {
+            element.innerHTML = '';
+            var head = document.createElement('thead');
+            head.appendChild(row(table.columns, 'th'));
+            element.appendChild(head);
+            body = document.createElement('tbody');
+            element.appendChild(body);
+        }
+        table.rows.forEach(function (cells) {
+            body.appendChild(row(cells, 'td'));
+        });
+        while (body.children.length > table.limit) {
+            body.removeChild(body.firstChild);
+        }
+    }
+
+    function apply(event) {
+        // A viewer that just connected can get a delta it already has in the full state
+        if (event.seq <= lastSeq) {
+            return;
+        }
+        lastSeq = event.seq;
+        applyFigures(event.figures || {});
+        applyTexts(event.texts || {});
+        applyLists(event.lists || {});
+        if (event.table) {
+            applyTable(event.table);
+        }
+    }
+
+    // Dash renders the layout after the page loads, wait for the graphs before connecting
+    function ready(root) {
+        var graphs = root.querySelectorAll('.dash-graph');
+        for (var i = 0; i < graphs.length; i++) {
+            if (!graphs[i].querySelector('.js-plotly-plot')) {
+                return false;
+            }
+        }
+        return window.Plotly !== undefined;
+    }
+
+    function connect() {
+        var root = document.getElementById('live-dashboard');
+        if (!root || !ready(root)) {
+            setTimeout(connect, 200);
+            return;
+        }
+        var source = new EventSource(root.getAttribute('data-events') || '/events');
+        source.onmessage = function (message) {
+            apply(JSON.parse(message.data));
+        };
+        // EventSource reconnects by itself; the server starts every connection with the full state
+        source.onerror = function () {
+            lastSeq = 0;
+        };
+    }
+
+    connect();
+})();
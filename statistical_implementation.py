@@ -1,112 +1,207 @@
-from tensorflow.keras.preprocessing.image import img_to_array
-from tensorflow.keras.models import load_model
-import numpy as np
+from model_registry import registry, get_models
+from tracker import FaceTracker, classify_tracks
+from cadence import AdaptiveDetector, format_stats as format_detector_stats
+from motion_gate import MotionGate, add_face_regions, detect_in_regions, format_stats as format_gate_stats
+from pipeline import Pipeline, DROP_OLDEST, END, format_stats
+from prediction_sink import PredictionWriter
+from metrics import metrics, format_stats as format_metric_stats
+from detectors import load_detector
+from prediction_cache import PredictionCache, format_stats as format_cache_stats
+from clip_recorder import ClipRecorder, format_stats as format_recorder_stats
 import cv2
-import cvlib as cv
-import os
-import csv
-
-# Function to append a new prediction to the CSV file
-def append_prediction_to_csv(age, gender, filename='predictions.csv'):
-    # Check if the file exists
-    if not os.path.isfile(filename):
-        # If file does not exist, create it with headers
-        with open(filename, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Predicted_Age', 'Predicted_Gender'])
-
-    # Append the new prediction
-    with open(filename, 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([age, gender])
-
-# Load gender detection model
-gender_model = load_model('gender_detection.h5')
-
-# Load age detection model
-age_model = load_model('age_detection.h5')
-
-# Define gender and age categories
-gender_classes = ['man', 'woman']
-age_categories = ['0-12', '13-25', '26-35', '36-45', '46-55', '56-65', '66-75', '76+']
+import time
+
+# Start loading and warming up the age and gender models in the background while the camera opens
+registry.start()
+
+# Buffered writer that appends predictions to the CSV file in the background
+writer = PredictionWriter('predictions.csv', header=['Predicted_Age', 'Predicted_Gender'])
 
 # Open webcam
 webcam = cv2.VideoCapture(0)
 
-# Define the folder path where you want to save the videos
-output_folder = r'C:\Users\91951\Downloads\agegender'
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
+# Record clips only while faces are in view, starting pre_roll seconds before they appear and ending
+# after idle seconds without faces; clips and their index.jsonl go to clip_folder
+clip_folder = 'clips'
+recorder = ClipRecorder(clip_folder, fps=20.0, pre_roll=3.0, idle=5.0, max_clip=300.0)
 
-output_path = os.path.join(output_folder, 'output.mp4')
+# Tracker giving each person a track id, so they are classified a few times and logged once
+tracker = FaceTracker()
 
-# Define the codec and create VideoWriter object
-fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # You can also use 'XVID'
-out = cv2.VideoWriter(output_path, fourcc, 20.0, (640, 480))
+# Skip face detection on frames where nothing moved, and optionally look for faces only
+# in the parts of the frame that changed
+motion_gating = True
+restrict_to_motion = True
+motion_gate = MotionGate(sensitivity=0.002)
 
-# Loop through frames
-while webcam.isOpened():
+# Run the full face detector only every few frames and on motion, carrying the boxes forward with
+# optical flow in between; the interval adapts so face detection takes at most 1/target_fps per frame
+adaptive_detection = True
+target_fps = 20.0
 
-    # Read frame from webcam 
-    status, frame = webcam.read()
 
-    if not status:
-        break
+# Face detector backend (cvlib, ssd, haar or yunet) and the width frames are downscaled to for
+# detection, 0 to detect at 640x480; see detectors.py
+detector_backend = 'cvlib'
+detect_width = 0
+face_detector = load_detector(detector_backend, width=detect_width)
+
+
+# Function to run the face detector, only on the changed regions when restrict_to_motion is set
+# The faces already being followed are always searched too, whether or not they moved
+def detect_faces(frame):
+    with metrics.timed('detect_face'):
+        if motion_gating and restrict_to_motion:
+            known = [track.box for track in list(tracker.tracks)] + detector.boxes
+            regions = add_face_regions(motion_gate.regions, known, frame.shape)
+            return detect_in_regions(frame, regions, lambda crop: face_detector(crop)[0])
+        face, confidence = face_detector(frame)
+        return face
+
 
+detector = AdaptiveDetector(detect_faces, target_fps=target_fps)
+
+# Reuse the prediction of a near-identical crop at the same place from the last ttl seconds instead
+# of running the models again; max_distance is the number of differing bits of the 64 bit crop hash
+prediction_caching = True
+prediction_cache = PredictionCache(max_size=256, ttl=2.0, max_distance=6, max_shift=24) if prediction_caching else None
+
+# Pipeline settings: queue length between stages and what to do when a queue is full
+queue_size = 4
+drop_policy = DROP_OLDEST  # or BLOCK to never lose frames
+stats_interval = 5.0
+
+# Per-step latency percentiles, fps, queue depths and drops are served at http://127.0.0.1:<metrics_port>/metrics
+# (Prometheus text) and /metrics.json; set trace_file to also record every timed step as a Chrome trace
+metrics_port = 9108
+trace_file = None
+
+
+# Detection stage: resize the frame and find faces
+def detect(frame):
     # Resize frame to match the VideoWriter resolution
-    frame = cv2.resize(frame, (640, 480))
+    with metrics.timed('resize'):
+        frame = cv2.resize(frame, (640, 480))
 
-    # Apply face detection
-    face, confidence = cv.detect_face(frame)
+    # Skip static frames, unless someone is still in view
+    if motion_gating and not motion_gate(frame, keep_alive=bool(tracker.tracks)):
+        detector.reset()
+        return frame, []
 
-    # Loop through detected faces
-    for idx, f in enumerate(face):
+    # Apply face detection, or carry the last faces forward between detections
+    if adaptive_detection:
+        face, detected = detector(frame)
+    else:
+        face = detect_faces(frame)
 
-        # Crop the detected face region
-        face_crop = np.copy(frame[f[1]:f[3], f[0]:f[2]])
+    return frame, face
+
+
+# Classification stage: follow faces across frames and classify each person a bounded number of times
+def classify(item):
+    frame, face = item
+    tracks, finished = tracker.update(face)
+    classify_tracks(tracker, frame, face, tracks, *get_models(), cache=prediction_cache)
+    return frame, face, tracks, finished
 
-        if (face_crop.shape[0]) < 10 or (face_crop.shape[1]) < 10:
-            continue
 
-        # Preprocessing for gender and age detection models
-        face_crop = cv2.resize(face_crop, (96, 96))
-        face_crop = face_crop.astype("float") / 255.0
-        face_crop = img_to_array(face_crop)
-        face_crop = np.expand_dims(face_crop, axis=0)
+# Function to log the voted age and gender of tracks that left the view, one row per person
+def log_tracks(tracks):
+    for track in tracks:
+        age_label, age_conf, gender_label, gender_conf = track.result()
+        writer.write([age_label, gender_label])
+        recorder.record([track.track_id, age_label, gender_label])
 
-        # Apply gender detection on face
-        gender_conf = gender_model.predict(face_crop)[0]
-        gender_idx = np.argmax(gender_conf)
-        gender_label = gender_classes[gender_idx]
 
-        # Apply age detection on face
-        age_conf = age_model.predict(face_crop)[0]
-        age_idx = np.argmax(age_conf)
-        age_label = age_categories[age_idx]
+# Output stage: log predictions, annotate and record the frame
+def sink(item):
+    frame, face, tracks, finished = item
 
-        # Append prediction to CSV
-        append_prediction_to_csv(age_label, gender_label)
+    # Append one prediction per finished track to CSV
+    with metrics.timed('csv_write'):
+        log_tracks(finished)
+
+    # Loop through detected faces
+    for f, track in zip(face, tracks):
+
+        # Skip faces that haven't been classified yet
+        result = track.result()
+        if result is None:
+            continue
+
+        age_label, age_conf, gender_label, gender_conf = result
 
         # Draw rectangle over face
         cv2.rectangle(frame, (f[0], f[1]), (f[2], f[3]), (0, 255, 0), 2)
 
         # Write labels and confidence above face rectangle
-        gender_text = "{}".format(gender_label)
+        gender_text = "{} #{}".format(gender_label, track.track_id)
         age_text = "{}".format(age_label)
         cv2.putText(frame, gender_text, (f[0], f[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         cv2.putText(frame, age_text, (f[0], f[1] - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
-    # Write the frame into the file
-    out.write(frame)
+    # Keep the frame for the pre-roll, or add it to the clip being recorded
+    with metrics.timed('video_write'):
+        recorder.write(frame, bool(face))
+
+    return frame
+
+
+# Run capture, detection, classification and output each on their own thread
+pipeline = Pipeline(webcam, [('detect', detect), ('classify', classify), ('sink', sink)],
+                    queue_size=queue_size, drop_policy=drop_policy)
+pipeline.start()
+last_stats = time.time()
+
+metrics.add_collector('pipeline', pipeline.stats)
+if adaptive_detection:
+    metrics.add_collector('detector', detector.stats)
+if motion_gating:
+    metrics.add_collector('motion_gate', motion_gate.stats)
+metrics.add_collector('writer', writer.stats)
+if prediction_caching:
+    metrics.add_collector('prediction_cache', prediction_cache.stats)
+metrics.add_collector('recorder', recorder.stats)
+if trace_file:
+    metrics.trace_to(trace_file)
+metrics.serve(metrics_port)
+
+# Display frames as they come out of the pipeline
+while True:
+    frame = pipeline.get()
+    if frame is END:
+        break
 
     # Display output
-    cv2.imshow("Gender and Age Detection", frame)
+    with metrics.timed('imshow'):
+        cv2.imshow("Gender and Age Detection", frame)
+
+    # Print per-stage throughput
+    if time.time() - last_stats >= stats_interval:
+        print(format_stats(pipeline.stats()))
+        if adaptive_detection:
+            print(format_detector_stats(detector.stats()))
+        if motion_gating:
+            print(format_gate_stats(motion_gate.stats()))
+        if prediction_caching:
+            print(format_cache_stats(prediction_cache.stats()))
+        print(format_recorder_stats(recorder.stats()))
+        print(format_metric_stats(metrics.stats()))
+        last_stats = time.time()
 
     # Press "Q" to stop
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-# Release resources
+# Let queued frames finish before releasing resources
+pipeline.drain()
+print(format_stats(pipeline.stats()))
+
+# Log the people still in view
+log_tracks(tracker.finish())
+
+# Release resources, flushing any predictions still buffered
+writer.close()
 webcam.release()
-out.release()
+recorder.close()
 cv2.destroyAllWindows()
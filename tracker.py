@@ -0,0 +1,151 @@
+import collections
+import itertools
+
+from inference import age_categories, gender_classes, predict_faces
+
+
+# Function to get the intersection over union of two (startX, startY, endX, endY) boxes
+def iou(a, b):
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[2], b[2])
+    y2 = min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    if inter == 0:
+        return 0.0
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+# Function to get the distance between the centres of two boxes, relative to the size of the first
+def centroid_distance(a, b):
+    size = max(a[2] - a[0], a[3] - a[1], 1)
+    dx = (a[0] + a[2] - b[0] - b[2]) / 2.0
+    dy = (a[1] + a[3] - b[1] - b[3]) / 2.0
+    return (dx * dx + dy * dy) ** 0.5 / size
+
+
+# One person followed across frames
+class Track:
+    def __init__(self, track_id, box, frame_idx, timestamp=None):
+        self.track_id = track_id
+        self.box = list(box)
+        self.first_frame = frame_idx
+        self.last_frame = frame_idx
+        self.last_classified = None
+        self.timestamp = timestamp
+        self.hits = 1
+        self.classifications = 0
+        self.age_votes = collections.Counter()
+        self.gender_votes = collections.Counter()
+
+    # Function to add one (age_label, age_conf, gender_label, gender_conf) prediction as a weighted vote
+    def add_prediction(self, prediction, frame_idx):
+        age_label, age_conf, gender_label, gender_conf = prediction
+        self.age_votes[age_label] += age_conf
+        self.gender_votes[gender_label] += gender_conf
+        self.classifications += 1
+        self.last_classified = frame_idx
+
+    # Function to get the confidence-weighted vote as an (age_label, age_conf, gender_label, gender_conf)
+    # tuple, the confidences being the winners' share of all votes; None before the first prediction
+    def result(self):
+        if not self.classifications:
+            return None
+        age_label, age_votes = max(self.age_votes.items(), key=lambda item: (item[1], -age_categories.index(item[0])))
+        gender_label, gender_votes = max(self.gender_votes.items(), key=lambda item: (item[1], -gender_classes.index(item[0])))
+        return (age_label, age_votes / sum(self.age_votes.values()),
+                gender_label, gender_votes / sum(self.gender_votes.values()))
+
+
+# IoU/centroid multi-object tracker over the face boxes of successive frames
+# Each track is classified at most max_classifications times, at least classify_every frames apart,
+# and is reported as finished once it hasn't been matched for max_missed frames
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_distance=0.5, max_missed=15,
+                 max_classifications=3, classify_every=5, min_hits=3):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.max_classifications = max_classifications
+        self.classify_every = classify_every
+        self.min_hits = min_hits
+        self.tracks = []
+        self.frame_idx = -1
+        self.ids = itertools.count(1)
+
+    # Function to match the boxes of a new frame to the tracks
+    # Returns the track of every box (same order as face) and the tracks that just finished
+    def update(self, face, timestamp=None):
+        self.frame_idx += 1
+        assigned = [None] * len(face)
+        free = set(range(len(self.tracks)))
+
+        # Greedy matching on IoU first, then on centroid distance for fast moving faces
+        pairs = sorted(((iou(track.box, box), t, b) for t, track in enumerate(self.tracks)
+                        for b, box in enumerate(face)), reverse=True)
+        for score, t, b in pairs:
+            if score < self.iou_threshold:
+                break
+            if t in free and assigned[b] is None:
+                assigned[b] = self.tracks[t]
+                free.discard(t)
+
+        pairs = sorted((centroid_distance(self.tracks[t].box, box), t, b) for t in free
+                       for b, box in enumerate(face) if assigned[b] is None)
+        for distance, t, b in pairs:
+            if distance > self.max_distance:
+                break
+            if t in free and assigned[b] is None:
+                assigned[b] = self.tracks[t]
+                free.discard(t)
+
+        for b, box in enumerate(face):
+            track = assigned[b]
+            if track is None:
+                track = Track(next(self.ids), box, self.frame_idx, timestamp)
+                self.tracks.append(track)
+                assigned[b] = track
+            else:
+                track.box = list(box)
+                track.last_frame = self.frame_idx
+                track.hits += 1
+
+        finished = [track for track in self.tracks if self.frame_idx - track.last_frame > self.max_missed]
+        if finished:
+            self.tracks = [track for track in self.tracks if self.frame_idx - track.last_frame <= self.max_missed]
+
+        return assigned, [track for track in finished if self.is_confirmed(track)]
+
+    # Function to check whether a track should be classified on the current frame
+    def needs_classification(self, track):
+        if track.classifications >= self.max_classifications:
+            return False
+        return track.last_classified is None or self.frame_idx - track.last_classified >= self.classify_every
+
+    def add_prediction(self, track, prediction):
+        track.add_prediction(prediction, self.frame_idx)
+
+    # Tracks seen for only a frame or two are usually detector noise and are not reported
+    def is_confirmed(self, track):
+        return track.hits >= self.min_hits and track.classifications > 0
+
+    # Function to end all tracks (e.g. on shutdown), returns the ones worth reporting
+    def finish(self):
+        finished = [track for track in self.tracks if self.is_confirmed(track)]
+        self.tracks = []
+        return finished
+
+
+# Function to run the models only on the faces whose tracks still need a classification
+# Returns the number of faces classified; cache is an optional PredictionCache for near-duplicate crops
+def classify_tracks(tracker, frame, face, tracks, gender_model, age_model=None, cache=None):
+    pending = [idx for idx, track in enumerate(tracks) if tracker.needs_classification(track)]
+    if not pending:
+        return 0
+
+    predictions = predict_faces(frame, [face[idx] for idx in pending], gender_model, age_model, cache)
+    for idx, prediction in zip(pending, predictions):
+        if prediction is not None:
+            tracker.add_prediction(tracks[idx], prediction)
+    return len(pending)
@@ -0,0 +1,138 @@
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.utils import to_categorical
+from tensorflow.keras.models import load_model
+from sklearn.model_selection import train_test_split
+from model import build_fused
+from inference import age_categories, img_dims, run_model
+import utkface
+import numpy as np
+import argparse
+import json
+import os
+import time
+import cv2
+
+# initial parameters
+epochs = 100
+lr = 1e-3
+batch_size = 64
+
+
+# Function to load UTKFace images as a uint8 array with gender and age category labels
+def load_dataset(dataset_dir):
+    samples = utkface.list_images(dataset_dir)
+    data = np.empty((len(samples),) + img_dims, dtype="uint8")
+    genders = np.empty(len(samples), dtype="int64")
+    ages = np.empty(len(samples), dtype="int64")
+
+    n = 0
+    for path, age, gender in samples:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        data[n] = cv2.resize(image, (img_dims[0], img_dims[1]))
+        genders[n] = gender
+        ages[n] = age
+        n += 1
+
+    return data[:n], genders[:n], ages[:n]
+
+
+# Generator that applies the same augmentation as the gender notebook and yields both targets
+def augmented_flow(aug, x, gender_y, age_y, batch_size):
+    indices = np.arange(len(x))
+    for batch_x, batch_idx in aug.flow(x, indices, batch_size=batch_size):
+        yield batch_x, {"gender": gender_y[batch_idx], "age": age_y[batch_idx]}
+
+
+# Function to measure ms per face for a set of models at a given batch size
+def measure_latency(models, x, batch, repeats=20):
+    sample = x[:batch]
+    for model in models:
+        run_model(model, sample)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for model in models:
+            run_model(model, sample)
+    return (time.perf_counter() - start) / (repeats * len(sample)) * 1000.0
+
+
+# Function to compare the fused model against the separate gender and age models on a held-out split
+def compare(fused_model, testX, testGender, testAge, gender_model=None, age_model=None):
+    report = {}
+
+    gender_conf, age_conf = fused_model.predict(testX, batch_size=batch_size, verbose=0)
+    report["fused"] = {
+        "gender_accuracy": float(np.mean(np.argmax(gender_conf, axis=1) == testGender)),
+        "age_accuracy": float(np.mean(np.argmax(age_conf, axis=1) == testAge)),
+        "ms_per_face_batch_1": measure_latency([fused_model], testX, 1),
+        "ms_per_face_batch_16": measure_latency([fused_model], testX, 16),
+    }
+
+    if gender_model is not None and age_model is not None:
+        gender_conf = gender_model.predict(testX, batch_size=batch_size, verbose=0)
+        age_conf = age_model.predict(testX, batch_size=batch_size, verbose=0)
+        report["separate"] = {
+            "gender_accuracy": float(np.mean(np.argmax(gender_conf, axis=1) == testGender)),
+            "age_accuracy": float(np.mean(np.argmax(age_conf, axis=1) == testAge)),
+            "ms_per_face_batch_1": measure_latency([gender_model, age_model], testX, 1),
+            "ms_per_face_batch_16": measure_latency([gender_model, age_model], testX, 16),
+        }
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train and export the fused age and gender model')
+    parser.add_argument('--dataset', default='UTKFace')
+    parser.add_argument('--output', default='age_gender_detection.h5')
+    parser.add_argument('--epochs', type=int, default=epochs)
+    parser.add_argument('--compare-only', action='store_true', help='skip training and evaluate an existing fused model')
+    parser.add_argument('--gender-model', default='gender_detection.h5')
+    parser.add_argument('--age-model', default='age_detection.h5')
+    parser.add_argument('--report', default='fused_comparison.json')
+    args = parser.parse_args()
+
+    data, genders, ages = load_dataset(args.dataset)
+
+    # split dataset for training and validation
+    (trainX, testX, trainGender, testGender, trainAge, testAge) = train_test_split(
+        data, genders, ages, test_size=0.2, random_state=42)
+
+    testX = testX.astype("float32") / 255.0
+
+    if args.compare_only:
+        fused_model = load_model(args.output)
+    else:
+        # augmenting datset
+        aug = ImageDataGenerator(rescale=1.0 / 255, rotation_range=25, width_shift_range=0.1,
+                                 height_shift_range=0.1, shear_range=0.2, zoom_range=0.2,
+                                 horizontal_flip=True, fill_mode="nearest")
+
+        fused_model = build_fused(width=img_dims[0], height=img_dims[1], depth=img_dims[2],
+                                  age_classes=len(age_categories))
+        fused_model.compile(loss={"gender": "binary_crossentropy", "age": "categorical_crossentropy"},
+                            optimizer=Adam(learning_rate=lr),
+                            metrics={"gender": ["accuracy"], "age": ["accuracy"]})
+
+        fused_model.fit(
+            augmented_flow(aug, trainX, to_categorical(trainGender, num_classes=2),
+                           to_categorical(trainAge, num_classes=len(age_categories)), batch_size),
+            validation_data=(testX, {"gender": to_categorical(testGender, num_classes=2),
+                                     "age": to_categorical(testAge, num_classes=len(age_categories))}),
+            steps_per_epoch=len(trainX) // batch_size,
+            epochs=args.epochs, verbose=1
+        )
+
+        fused_model.save(args.output)
+
+    gender_model = age_model = None
+    if os.path.isfile(args.gender_model) and os.path.isfile(args.age_model):
+        gender_model = load_model(args.gender_model)
+        age_model = load_model(args.age_model)
+
+    report = compare(fused_model, testX, testGender, testAge, gender_model, age_model)
+    with open(args.report, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
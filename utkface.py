@@ -0,0 +1,43 @@
+import os
+import glob
+
+from inference import age_categories
+
+# Upper bound (inclusive) of every age category except the open-ended last one
+age_bounds = [12, 25, 35, 45, 55, 65, 75]
+
+
+# Function to map an age in years to its index in age_categories
+def age_to_category(age):
+    for idx, bound in enumerate(age_bounds):
+        if age <= bound:
+            return idx
+    return len(age_categories) - 1
+
+
+# Function to parse the age, gender and race fields of a UTKFace filename
+# e.g. UTKFace/26_1_0_20170116171048641.jpg.chip.jpg -> (26, 1, 0)
+# Returns None for files that don't follow the naming scheme
+def parse_filename(path):
+    fields = os.path.basename(path).split('_')
+    if len(fields) < 4:
+        return None
+    try:
+        return int(fields[0]), int(fields[1]), int(fields[2])
+    except ValueError:
+        return None
+
+
+# Function to list every labelled image in a UTKFace directory
+# Gender uses the same encoding as the gender model: 0 = man, 1 = woman
+def list_images(dataset_dir='UTKFace'):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(dataset_dir, '**', '*.jpg'), recursive=True)):
+        fields = parse_filename(path)
+        if fields is None:
+            continue
+        age, gender, race = fields
+        if gender not in (0, 1):
+            continue
+        samples.append((path, age_to_category(age), gender))
+    return samples
@@ -5,90 +5,148 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import io
-import base64
-from flask import Blueprint, render_template
+import hashlib
+import threading
+from email.utils import formatdate
+from flask import Blueprint, render_template, request, abort, Response
 
 visualization_blueprint = Blueprint('visualization', __name__, template_folder='templates')
 
-# Load data from CSV file
-try:
-    data = pd.read_csv('predictions.csv')
-    print("CSV file loaded successfully.")
-except Exception as e:
-    print(f"Error loading CSV file: {e}")
+# CSV file the charts are drawn from
+data_file = 'predictions.csv'
 
 # Ensure the directory 'static/images' exists
 images_dir = os.path.join('static', 'images')
 os.makedirs(images_dir, exist_ok=True)
 print(f"Images directory: {images_dir}")
 
-@visualization_blueprint.route('/')
-def visualization():
-    # Generate plots
-    bar_chart_age = generate_bar_chart_age()
-    pie_chart_age = generate_pie_chart_age()
-    bar_chart_gender = generate_bar_chart_gender()
+# Rendered charts, keyed by chart name: (data version, png bytes, etag, last modified)
+chart_cache = {}
 
-    return render_template('visualization.html', 
-                           bar_chart_age=bar_chart_age,
-                           pie_chart_age=pie_chart_age,
-                           bar_chart_gender=bar_chart_gender)
+# matplotlib's pyplot is not thread safe, and concurrent viewers should wait for one render
+# instead of each rendering the same chart
+render_lock = threading.Lock()
 
-def generate_bar_chart_age():
-    try:
-        print("Generating age bar chart...")
-        plt.figure(figsize=(10, 6))
-        sns.countplot(x='Predicted_Age', data=data, palette='viridis')
-        plt.xlabel('Age Group')
-        plt.ylabel('Count')
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        bar_chart_age = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        print("Age bar chart generated.")
-        print(f"Age bar chart base64: {bar_chart_age[:50]}...")  # Print first 50 characters for verification
-        return bar_chart_age
-    except Exception as e:
-        print(f"Error generating age bar chart: {e}")
-        return ""
+# Data loaded for the current version of the CSV file
+data = None
+data_version = None
 
-def generate_pie_chart_age():
+
+# Function to get the version of the CSV file, changes whenever rows are appended
+def get_data_version():
     try:
-        print("Generating age pie chart...")
-        age_counts = data['Predicted_Age'].value_counts()
-
-        # Create the pie chart
-        plt.figure(figsize=(8, 6))
-        plt.pie(age_counts, labels=age_counts.index, autopct='%1.1f%%', shadow=True, startangle=140)
-        plt.ylabel('Age Group Distribution')
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        pie_chart_age = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        print("Age pie chart generated.")
-        print(f"Age pie chart base64: {pie_chart_age[:50]}...")  # Print first 50 characters for verification
-        return pie_chart_age
-    except Exception as e:
-        print(f"Error generating age pie chart: {e}")
-        return ""
+        stat = os.stat(data_file)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
 
-def generate_bar_chart_gender():
+
+# Function to load the CSV file again if it changed since the last load, called under render_lock
+def load_data(version):
+    global data, data_version
+    if version == data_version:
+        return data
     try:
-        print("Generating gender bar chart...")
-        plt.figure(figsize=(10, 6))
-        sns.countplot(x='Predicted_Gender', data=data, palette='viridis')
-        plt.xlabel('Gender')
-        plt.ylabel('Count')
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        bar_chart_gender = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        print("Gender bar chart generated.")
-        print(f"Gender bar chart base64: {bar_chart_gender[:50]}...")  # Print first 50 characters for verification
-        return bar_chart_gender
+        data = pd.read_csv(data_file)
+        print("CSV file loaded successfully.")
     except Exception as e:
-        print(f"Error generating gender bar chart: {e}")
-        return ""
+        print(f"Error loading CSV file: {e}")
+        data = pd.DataFrame(columns=['Predicted_Age', 'Predicted_Gender'])
+    data_version = version
+    return data
+
+
+# Function to render the current matplotlib figure to PNG bytes
+def figure_to_png():
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png')
+    plt.close()
+    return buffer.getvalue()
+
+
+def generate_bar_chart_age(data):
+    plt.figure(figsize=(10, 6))
+    sns.countplot(x='Predicted_Age', data=data, palette='viridis')
+    plt.xlabel('Age Group')
+    plt.ylabel('Count')
+    return figure_to_png()
+
+
+def generate_pie_chart_age(data):
+    age_counts = data['Predicted_Age'].value_counts()
+
+    # Create the pie chart
+    plt.figure(figsize=(8, 6))
+    plt.pie(age_counts, labels=age_counts.index, autopct='%1.1f%%', shadow=True, startangle=140)
+    plt.ylabel('Age Group Distribution')
+    return figure_to_png()
+
+
+def generate_bar_chart_gender(data):
+    plt.figure(figsize=(10, 6))
+    sns.countplot(x='Predicted_Gender', data=data, palette='viridis')
+    plt.xlabel('Gender')
+    plt.ylabel('Count')
+    return figure_to_png()
+
+
+charts = {
+    'bar_chart_age': generate_bar_chart_age,
+    'pie_chart_age': generate_pie_chart_age,
+    'bar_chart_gender': generate_bar_chart_gender,
+}
+
+
+# Function to get a chart from the cache, rendering it only if the data changed since it was cached
+# Returns None if the chart could not be rendered
+def get_chart(name):
+    version = get_data_version()
+    cached = chart_cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached
+
+    with render_lock:
+        # Another request may have rendered it while this one was waiting
+        cached = chart_cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached
+
+        # A failed render is not cached, the next request tries again
+        try:
+            print(f"Generating {name}...")
+            png = charts[name](load_data(version))
+        except Exception as e:
+            print(f"Error generating {name}: {e}")
+            return None
+
+        etag = hashlib.sha1(png).hexdigest()
+        last_modified = version[0] / 1e9 if version else None
+        cached = (version, png, etag, last_modified)
+        chart_cache[name] = cached
+        return cached
+
+
+@visualization_blueprint.route('/')
+def visualization():
+    # The page only links to the chart images, the version makes the browser fetch new ones when data changes
+    version = get_data_version()
+    version = '{:x}-{:x}'.format(*version) if version else '0'
+    return render_template('visualization.html', version=version)
+
+
+@visualization_blueprint.route('/charts/<name>.png')
+def chart(name):
+    if name not in charts:
+        abort(404)
+
+    cached = get_chart(name)
+    if cached is None:
+        abort(500)
+
+    version, png, etag, last_modified = cached
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)